@@ -0,0 +1,204 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import tempfile
+import time
+import tracemalloc
+import fitz
+
+from features import DEFAULT_GRANULARITY, DEFAULT_PAGE_WINDOW, GRANULARITIES, iter_page_windows
+import process_pdfs
+
+BODY_FONTS = ["helv", "tiro", "cour"]
+HEADING_FONTS = ["hebo", "tibo", "cobo"]
+HEADING_SIZES = {"H1": 20, "H2": 16, "H3": 13}
+WORDS = ("lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor "
+         "incididunt ut labore et dolore magna aliqua enim ad minim veniam quis nostrud").split()
+
+def generate_pdf(path, pages, heading_density=0.1, font_mix=1, columns=1, seed=0):
+    """
+    Write a synthetic PDF with ``pages`` pages of body text and headings.
+
+    ``heading_density`` is the fraction of lines that are headings (levels
+    cycling H1-H3), ``font_mix`` how many body/heading font families are used,
+    and ``columns`` the number of text columns per page.
+    """
+    rng = random.Random(seed)
+    doc = fitz.open()
+    body_fonts = BODY_FONTS[:max(1, font_mix)]
+    heading_fonts = HEADING_FONTS[:max(1, font_mix)]
+    width, height, margin, gutter = 595, 842, 50, 20
+    col_width = (width - 2 * margin - gutter * (columns - 1)) / columns
+    levels = list(HEADING_SIZES)
+    for page_index in range(pages):
+        page = doc.new_page(width=width, height=height)
+        if page_index == 0:
+            page.insert_text((margin, margin + 24), "Synthetic Benchmark Document", fontsize=24, fontname="hebo")
+        for col in range(columns):
+            x = margin + col * (col_width + gutter)
+            y = margin + (60 if page_index == 0 else 20)
+            while y < height - margin:
+                if rng.random() < heading_density:
+                    level = rng.choice(levels)
+                    size = HEADING_SIZES[level]
+                    text = f"{level} " + " ".join(rng.choice(WORDS).capitalize() for _ in range(rng.randint(2, 5)))
+                    font = rng.choice(heading_fonts)
+                else:
+                    size = 10
+                    n_words = max(3, int(col_width / 40))
+                    text = " ".join(rng.choice(WORDS) for _ in range(n_words))
+                    font = rng.choice(body_fonts)
+                y += size * 1.4
+                page.insert_text((x, y), text, fontsize=size, fontname=font)
+    doc.save(path)
+    doc.close()
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far (Linux reports KiB)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def time_document(pdf_path, model, granularity=DEFAULT_GRANULARITY, window=DEFAULT_PAGE_WINDOW):
+    """
+    Time extraction, featurization and prediction of one PDF separately, over
+    the same page windows ``process_pdfs`` streams. Python memory is measured
+    in a second pass, so tracemalloc's overhead does not skew the timings.
+    """
+    rows = 0
+    seconds = {"extract": 0.0, "featurize": 0.0, "predict": 0.0}
+    windows = iter_page_windows(pdf_path, window, granularity)
+    while True:
+        t0 = time.perf_counter()
+        columns = next(windows, None)
+        t1 = time.perf_counter()
+        seconds["extract"] += t1 - t0
+        if columns is None:
+            break
+        X = columns.feature_matrix()
+        t2 = time.perf_counter()
+        if len(X):
+            model.predict(X)
+        seconds["featurize"] += t2 - t1
+        seconds["predict"] += time.perf_counter() - t2
+        rows += len(columns)
+
+    tracemalloc.start()
+    for columns in iter_page_windows(pdf_path, window, granularity):
+        X = columns.feature_matrix()
+        if len(X):
+            model.predict(X)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "rows": rows,
+        "extract_seconds": round(seconds["extract"], 6),
+        "featurize_seconds": round(seconds["featurize"], 6),
+        "predict_seconds": round(seconds["predict"], 6),
+        "total_seconds": round(sum(seconds.values()), 6),
+        "python_peak_mb": round(peak / (1024 * 1024), 3),
+        "process_peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+def page_scaling(work_dir, model, page_counts, args):
+    results = []
+    for pages in page_counts:
+        pdf_path = os.path.join(work_dir, f"pages_{pages}.pdf")
+        generate_pdf(pdf_path, pages, args.heading_density, args.font_mix, args.columns, args.seed)
+        runs = [time_document(pdf_path, model, args.granularity, args.page_window) for _ in range(args.repeat)]
+        best = min(runs, key=lambda r: r["total_seconds"])
+        best["pages"] = pages
+        best["seconds_per_page"] = round(best["total_seconds"] / pages, 6)
+        results.append(best)
+        print(f"pages={pages:5d} rows={best['rows']:7d} total={best['total_seconds']:.3f}s "
+              f"(extract {best['extract_seconds']:.3f}, featurize {best['featurize_seconds']:.3f}, "
+              f"predict {best['predict_seconds']:.3f}) py-peak={best['python_peak_mb']:.1f}MB")
+    return results
+
+def file_scaling(work_dir, model_path, file_counts, args):
+    """Wall-clock time of ``process_pdfs.main`` over batches of synthetic PDFs."""
+    results = []
+    for count in file_counts:
+        input_dir = os.path.join(work_dir, f"files_{count}")
+        output_dir = input_dir + "_out"
+        os.makedirs(input_dir, exist_ok=True)
+        for i in range(count):
+            generate_pdf(os.path.join(input_dir, f"doc_{i:04d}.pdf"), args.file_pages,
+                         args.heading_density, args.font_mix, args.columns, args.seed + i)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            process_pdfs.main(input_dir, output_dir, model_path, args.workers,
+                              page_window=args.page_window, use_toc=False, granularity=args.granularity)
+        elapsed = time.perf_counter() - start
+        results.append({
+            "files": count,
+            "pages_per_file": args.file_pages,
+            "workers": args.workers or os.cpu_count(),
+            "total_seconds": round(elapsed, 6),
+            "files_per_second": round(count / elapsed, 3),
+        })
+        print(f"files={count:5d} total={elapsed:.3f}s ({count / elapsed:.1f} files/s)")
+    return results
+
+def compare(current, baseline_path):
+    """Print per-point timing ratios against an earlier results file."""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    for key, point in (("page_scaling", "pages"), ("file_scaling", "files")):
+        old = {r[point]: r for r in baseline.get(key, [])}
+        for r in current.get(key, []):
+            if r[point] in old:
+                ratio = r["total_seconds"] / max(old[r[point]]["total_seconds"], 1e-9)
+                print(f"{key} {point}={r[point]}: {ratio:.2f}x of baseline")
+
+def parse_counts(text):
+    return [int(x) for x in text.split(",") if x]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the outline extractor on synthetic PDFs")
+    parser.add_argument("--model", default="heading_classifier.joblib", help="Path to the heading classifier")
+    parser.add_argument("--pages", default="1,10,50,200", help="Comma-separated page counts")
+    parser.add_argument("--files", default="1,8,32", help="Comma-separated file counts")
+    parser.add_argument("--file-pages", type=int, default=10, help="Pages per PDF in the file-count sweep")
+    parser.add_argument("--heading-density", type=float, default=0.1)
+    parser.add_argument("--font-mix", type=int, default=2, help="Number of font families (1-3)")
+    parser.add_argument("--columns", type=int, default=1)
+    parser.add_argument("--granularity", choices=GRANULARITIES, default=DEFAULT_GRANULARITY)
+    parser.add_argument("--page-window", type=int, default=DEFAULT_PAGE_WINDOW,
+                        help="Pages featurized and classified at a time, as in process_pdfs.py")
+    parser.add_argument("--workers", type=int, default=None, help="Workers for the file-count sweep")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per page count (best is kept)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench_output.json", help="Machine-readable results file")
+    parser.add_argument("--compare", default=None, help="Earlier results file to compare against")
+    parser.add_argument("--keep", default=None, help="Keep generated PDFs in this folder")
+    args = parser.parse_args()
+    if args.page_window < 1:
+        parser.error("--page-window must be at least 1")
+
+    work_dir = args.keep or tempfile.mkdtemp(prefix="outline-bench-")
+    os.makedirs(work_dir, exist_ok=True)
+    try:
+        model = process_pdfs.load_model(args.model)
+        results = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "pymupdf": fitz.VersionBind,
+            "cpu_count": os.cpu_count(),
+            "config": vars(args),
+            "page_scaling": page_scaling(work_dir, model, parse_counts(args.pages), args),
+            "file_scaling": file_scaling(work_dir, args.model, parse_counts(args.files), args),
+        }
+    finally:
+        if not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+    if args.compare:
+        compare(results, args.compare)
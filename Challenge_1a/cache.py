@@ -0,0 +1,94 @@
+import hashlib
+import json
+import os
+import tempfile
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+def file_digest(path, chunk_size=1 << 20):
+    """SHA-256 hex digest of a file's contents."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+class OutlineCache:
+    """
+    On-disk outline cache keyed by PDF content hash plus model file hash.
+    ``variant`` folds any other output-changing settings (such as whether the
+    TOC fast path is used) into the key. Callers compute a PDF's key once
+    with ``key`` and pass it to both ``get`` and ``put``, so the file is
+    hashed once per lookup-and-store.
+
+    Every entry is one JSON file written via temp file + rename, so readers in
+    other processes never observe partial entries. A hit refreshes the entry's
+    mtime, and writes evict the least recently used entries once the directory
+    grows beyond ``max_bytes``.
+    """
+
+    def __init__(self, cache_dir, model_path, max_bytes=DEFAULT_MAX_BYTES, variant=""):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.model_digest = file_digest(model_path) + variant
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, pdf_path):
+        """Cache key of ``pdf_path``: hashes its contents."""
+        return hashlib.sha256((file_digest(pdf_path) + self.model_digest).encode()).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key + ".json")
+
+    def get(self, key):
+        """Return the cached outline for ``key``, or None on a miss."""
+        entry = self._entry_path(key)
+        try:
+            with open(entry, "r", encoding="utf-8") as f:
+                result = json.load(f)
+            os.utime(entry)
+        except (OSError, ValueError):
+            return None
+        return result
+
+    def put(self, key, result):
+        """Store ``result`` under ``key`` and evict old entries if needed."""
+        entry = self._entry_path(key)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(result, f, ensure_ascii=False)
+            os.replace(tmp_path, entry)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+        self.evict()
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits in ``max_bytes``."""
+        entries = []
+        total = 0
+        with os.scandir(self.cache_dir) as it:
+            for e in it:
+                if not e.name.endswith(".json"):
+                    continue
+                try:
+                    st = e.stat()
+                except OSError:
+                    continue  # removed by another process
+                entries.append((st.st_mtime, st.st_size, e.path))
+                total += st.st_size
+        if total <= self.max_bytes:
+            return
+        entries.sort()
+        for _, size, path in entries:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+            if total <= self.max_bytes:
+                break
@@ -0,0 +1,73 @@
+import argparse
+import glob
+import os
+import numpy as np
+from tree_predictor import CompiledForest
+
+def compile_model(model):
+    """Flatten a fitted scikit-learn tree classifier or tree ensemble into a ``CompiledForest``."""
+    estimators = getattr(model, "estimators_", [model])
+    if not all(hasattr(est, "tree_") for est in estimators):
+        raise ValueError(f"Unsupported model type: {type(model).__name__}")
+    if getattr(model, "n_outputs_", 1) != 1:
+        raise ValueError("Only single-output classifiers can be compiled")
+
+    roots, left, right, feature, threshold, value = [], [], [], [], [], []
+    offset = 0
+    for est in estimators:
+        tree = est.tree_
+        is_leaf = tree.children_left == -1
+        roots.append(offset)
+        left.append(np.where(is_leaf, -1, tree.children_left + offset))
+        right.append(np.where(is_leaf, -1, tree.children_right + offset))
+        feature.append(np.where(is_leaf, 0, tree.feature))
+        threshold.append(tree.threshold)
+        counts = tree.value[:, 0, :]
+        totals = counts.sum(axis=1, keepdims=True)
+        value.append(counts / np.where(totals == 0, 1.0, totals))
+        offset += tree.node_count
+
+    return CompiledForest(
+        classes=np.asarray(model.classes_).astype(str),
+        roots=np.asarray(roots, dtype=np.int64),
+        left=np.concatenate(left).astype(np.int64),
+        right=np.concatenate(right).astype(np.int64),
+        feature=np.concatenate(feature).astype(np.int64),
+        threshold=np.concatenate(threshold).astype(np.float64),
+        value=np.concatenate(value).astype(np.float64),
+        n_features=model.n_features_in_,
+    )
+
+def verify(model, compiled, pdf_dir):
+    """Compare labels of both predictors on every span of the PDFs in ``pdf_dir``."""
+    import warnings
+    from features import iter_page_windows
+    total = mismatched = 0
+    for pdf_path in sorted(glob.glob(os.path.join(pdf_dir, "*.pdf"))):
+        for columns in iter_page_windows(pdf_path):
+            if not len(columns):
+                continue
+            X = columns.feature_matrix()
+            with warnings.catch_warnings():
+                warnings.filterwarnings("ignore", message="X does not have valid feature names")
+                expected = model.predict(X)
+            total += len(X)
+            mismatched += int(np.sum(compiled.predict(X) != expected.astype(str)))
+    print(f"Verified {total} spans: {mismatched} mismatched labels")
+    return mismatched == 0
+
+if __name__ == "__main__":
+    import joblib
+    parser = argparse.ArgumentParser(description="Compile heading_classifier.joblib into a NumPy-only model")
+    parser.add_argument("model", nargs="?", default="heading_classifier.joblib", help="Fitted scikit-learn model")
+    parser.add_argument("output", nargs="?", default="heading_classifier.npz", help="Compiled model path")
+    parser.add_argument("--verify-dir", default=None, help="Check label parity on the PDFs in this folder")
+    args = parser.parse_args()
+
+    model = joblib.load(args.model)
+    compiled = compile_model(model)
+    compiled.save(args.output)
+    print(f"Compiled {len(compiled.roots)} trees ({len(compiled.left)} nodes) to {args.output} "
+          f"({os.path.getsize(args.output) / 1024:.0f} KB)")
+    if args.verify_dir and not verify(model, compiled, args.verify_dir):
+        raise SystemExit(1)
@@ -1,36 +1,190 @@
 import fitz 
+import numpy as np
+import metrics
 
-def extract_blocks(pdf_path):
-    doc = fitz.open(pdf_path)
-    blocks = []
-    for page_num, page in enumerate(doc, 1):
-        for block in page.get_text("dict")["blocks"]:
-            if block["type"] == 0:  # text block
-                for line in block["lines"]:
-                    for span in line["spans"]:
-                        text = span["text"].strip()
-                        if not text:
-                            continue
-                        blocks.append({
-                            "text": text,
-                            "font_size": span["size"],
-                            "font_name": span["font"],
-                            "font_flags": span["flags"],
-                            "bbox": span["bbox"],
-                            "page": page_num,
-                        })
-    return blocks
-
-def extract_features(block):
-    return {
-        "font_size": block["font_size"],
-        "is_bold": bool(block["font_flags"] & 2),
-        "is_italic": bool(block["font_flags"] & 1),
-        "font_name": block["font_name"],
-        "text_length": len(block["text"]),
-        "is_upper": block["text"].isupper(),
-        "is_title": block["text"].istitle(),
-        "y0": block["bbox"][1],  # vertical position
-        "y1": block["bbox"][3],
-        "page": block["page"],
-    }
+# Pages featurized and classified together in streaming mode
+DEFAULT_PAGE_WINDOW = 16
+
+# Rows handed to the classifier: one per "span", per "line", or per "block"
+# of consecutive same-style lines
+GRANULARITIES = ("span", "line", "block")
+# "line" and "block" rows are not what the shipped forest was trained on; keep
+# "span" as the default until the model is retrained on merged rows
+DEFAULT_GRANULARITY = "span"
+
+# Column order expected by heading_classifier.joblib
+FEATURE_COLUMNS = ["font_size", "is_bold", "is_italic", "text_length", "is_upper", "y0", "y1"]
+
+class SpanColumns:
+    """
+    Column-oriented span table: one NumPy array per feature plus a text side table.
+
+    Arrays are float32 because that is what scikit-learn trees compare against.
+    """
+
+    def __init__(self, capacity=1024):
+        self.size = 0
+        self.font_size = np.empty(capacity, dtype=np.float32)
+        self.flags = np.empty(capacity, dtype=np.int32)
+        self.bbox = np.empty((capacity, 4), dtype=np.float32)
+        self.text_length = np.empty(capacity, dtype=np.int32)
+        self.is_upper = np.empty(capacity, dtype=bool)
+        self.is_title = np.empty(capacity, dtype=bool)
+        self.page = np.empty(capacity, dtype=np.int32)
+        self.texts = []
+
+    def __len__(self):
+        return self.size
+
+    def _reserve(self, needed):
+        capacity = len(self.font_size)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        for name in ("font_size", "flags", "bbox", "text_length", "is_upper", "is_title", "page"):
+            old = getattr(self, name)
+            new = np.empty((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def add_page(self, page_dict, page_num, granularity=DEFAULT_GRANULARITY):
+        """Append the rows of a PyMuPDF ``get_text("dict")`` page at the given granularity."""
+        if granularity == "span":
+            rows = span_rows(page_dict)
+        elif granularity == "line":
+            rows = [row[:4] for row in line_rows(page_dict)]
+        elif granularity == "block":
+            rows = merge_lines(line_rows(page_dict))
+        else:
+            raise ValueError(f"Unknown granularity: {granularity!r}")
+        self._reserve(self.size + len(rows))
+        i = self.size
+        for text, size, flags, bbox in rows:
+            self.font_size[i] = size
+            self.flags[i] = flags
+            self.bbox[i] = bbox
+            self.text_length[i] = len(text)
+            self.is_upper[i] = text.isupper()
+            self.is_title[i] = text.istitle()
+            self.page[i] = page_num
+            self.texts.append(text)
+            i += 1
+        self.size = i
+
+    def feature_matrix(self):
+        """Return an (n, 7) float32 matrix in ``FEATURE_COLUMNS`` order."""
+        n = self.size
+        X = np.empty((n, len(FEATURE_COLUMNS)), dtype=np.float32)
+        X[:, 0] = self.font_size[:n]
+        X[:, 1] = (self.flags[:n] & 2) != 0  # bold
+        X[:, 2] = (self.flags[:n] & 1) != 0  # italic
+        X[:, 3] = self.text_length[:n]
+        X[:, 4] = self.is_upper[:n]
+        X[:, 5] = self.bbox[:n, 1]  # vertical position
+        X[:, 6] = self.bbox[:n, 3]
+        return X
+
+def span_rows(page_dict):
+    """``(text, size, flags, bbox)`` for every non-empty span of a page."""
+    rows = []
+    for block in page_dict["blocks"]:
+        if block["type"] != 0:  # text block
+            continue
+        for line in block["lines"]:
+            for span in line["spans"]:
+                text = span["text"].strip()
+                if text:
+                    rows.append((text, span["size"], span["flags"], span["bbox"]))
+    return rows
+
+def _same_box(a, b, tolerance=1.0):
+    return all(abs(u - v) <= tolerance for u, v in zip(a, b))
+
+def line_rows(page_dict):
+    """
+    One row per non-empty line, with features aggregated over its spans.
+
+    Span texts are concatenated as laid out; font size is that of the span
+    carrying the most characters, and the bold/italic flags are set when at
+    least half of the characters carry them. Rows carry the PyMuPDF block
+    number as a fifth element so ``merge_lines`` never crosses blocks.
+    Spans repeating the text of an earlier span on the page at (nearly) the
+    same bbox, as shadow or fake-bold rendering produces, are dropped before
+    joining.
+    """
+    rows = []
+    seen = {}
+    for block_num, block in enumerate(page_dict["blocks"]):
+        if block["type"] != 0:  # text block
+            continue
+        for line in block["lines"]:
+            spans = []
+            for span in line["spans"]:
+                if not span["text"].strip():
+                    continue
+                boxes = seen.setdefault(span["text"].strip(), [])
+                if any(_same_box(span["bbox"], box) for box in boxes):
+                    continue
+                boxes.append(span["bbox"])
+                spans.append(span)
+            if not spans:
+                continue
+            text = " ".join("".join(span["text"] for span in spans).split())
+            chars = [len(span["text"].strip()) for span in spans]
+            total = sum(chars)
+            size = max(zip(chars, (span["size"] for span in spans)))[1]
+            bold = sum(c for c, span in zip(chars, spans) if span["flags"] & 2) * 2 >= total
+            italic = sum(c for c, span in zip(chars, spans) if span["flags"] & 1) * 2 >= total
+            x0, y0, x1, y1 = spans[0]["bbox"]
+            for span in spans[1:]:
+                sx0, sy0, sx1, sy1 = span["bbox"]
+                x0, y0, x1, y1 = min(x0, sx0), min(y0, sy0), max(x1, sx1), max(y1, sy1)
+            rows.append((text, size, (2 if bold else 0) | (1 if italic else 0), (x0, y0, x1, y1), block_num))
+    return rows
+
+def merge_lines(rows, size_tolerance=0.5, max_gap_ratio=0.6):
+    """
+    Merge consecutive lines of the same block that share font size and
+    bold/italic flags and sit no further apart than ``max_gap_ratio`` times the
+    font size, so a heading wrapped over several lines becomes a single row.
+    """
+    merged = []
+    prev_block = None
+    for text, size, flags, bbox, block_num in rows:
+        if merged and block_num == prev_block:
+            p_text, p_size, p_flags, p_bbox = merged[-1]
+            gap = bbox[1] - p_bbox[3]
+            if (abs(size - p_size) <= size_tolerance and flags == p_flags
+                    and gap <= max_gap_ratio * size):
+                merged[-1] = (
+                    p_text + " " + text, p_size, p_flags,
+                    (min(p_bbox[0], bbox[0]), p_bbox[1], max(p_bbox[2], bbox[2]), bbox[3]),
+                )
+                prev_block = block_num
+                continue
+        merged.append((text, size, flags, bbox))
+        prev_block = block_num
+    return merged
+
+def iter_page_windows(pdf_path, window=DEFAULT_PAGE_WINDOW, granularity=DEFAULT_GRANULARITY):
+    """
+    Yield one ``SpanColumns`` per window of ``window`` consecutive pages.
+
+    Each page is dropped as soon as its spans are copied out, and PyMuPDF's
+    resource store is shrunk after every window, so peak memory depends on the
+    window size rather than on the document length.
+    """
+    with metrics.span("pdf_open"):
+        doc = fitz.open(pdf_path)
+    with doc:
+        metrics.count("pages", doc.page_count)
+        for start in range(0, doc.page_count, window):
+            columns = SpanColumns()
+            for page_index in range(start, min(start + window, doc.page_count)):
+                with metrics.span("page_parse"):
+                    page = doc.load_page(page_index)
+                    columns.add_page(page.get_text("dict"), page_index + 1, granularity)
+                    del page
+            fitz.TOOLS.store_shrink(100)
+            yield columns
@@ -1,7 +1,13 @@
 import os
-import joblib
-import pandas as pd
-from features import extract_blocks, extract_features
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import warnings
+import numpy as np
+import metrics
+from cache import DEFAULT_MAX_BYTES, OutlineCache
+from features import DEFAULT_GRANULARITY, DEFAULT_PAGE_WINDOW, GRANULARITIES, iter_page_windows
+from sharding import DEFAULT_LEASE_SECONDS, ShardQueue, run_worker
+from toc import outline_from_toc
+from tree_predictor import CompiledForest
 from utils import save_json
 
 LABEL_TO_LEVEL = {
@@ -11,32 +17,153 @@ LABEL_TO_LEVEL = {
     "H3": "H3"
 }
 
-def process_pdf(pdf_path, model):
-    blocks = extract_blocks(pdf_path)
-    features = [extract_features(b) for b in blocks]
-    df = pd.DataFrame(features)
-    preds = model.predict(df[[
-        "font_size", "is_bold", "is_italic", "text_length", "is_upper", "y0", "y1"
-    ]])
+def iter_outline(pdf_path, model, page_window=DEFAULT_PAGE_WINDOW, granularity=DEFAULT_GRANULARITY):
+    """Yield ``(label, text, page)`` for every non-"Other" row, one page window at a time."""
+    for columns in iter_page_windows(pdf_path, page_window, granularity):
+        if not len(columns):
+            continue
+        metrics.count("rows_classified", len(columns))
+        with metrics.span("predict"), warnings.catch_warnings():
+            # The model was fitted on a DataFrame; column order is fixed by FEATURE_COLUMNS.
+            warnings.filterwarnings("ignore", message="X does not have valid feature names")
+            preds = model.predict(columns.feature_matrix())
+        for i in np.flatnonzero(preds != "Other"):
+            yield preds[i], columns.texts[i], int(columns.page[i])
+
+@metrics.timed("pdf")
+def process_pdf(pdf_path, model, page_window=DEFAULT_PAGE_WINDOW, cache=None, use_toc=True,
+                granularity=DEFAULT_GRANULARITY):
+    if cache is not None:
+        with metrics.span("cache_lookup"):
+            key = cache.key(pdf_path)
+            cached = cache.get(key)
+        if cached is not None:
+            metrics.count("cache_hits")
+            return cached
+    # Fast path: a trustworthy embedded outline makes span classification unnecessary
+    with metrics.span("toc"):
+        result = outline_from_toc(pdf_path) if use_toc else None
+    if result is None:
+        with metrics.span("classify"):
+            result = classify_outline(pdf_path, model, page_window, granularity)
+    else:
+        metrics.count("toc_hits")
+    metrics.count("headings", len(result["outline"]))
+    if cache is not None:
+        cache.put(key, result)
+    return result
+
+def classify_outline(pdf_path, model, page_window=DEFAULT_PAGE_WINDOW, granularity=DEFAULT_GRANULARITY):
     outline = []
     title = None
-    for block, label in zip(blocks, preds):
-        if label == "Other":
-            continue
+    for label, text, page in iter_outline(pdf_path, model, page_window, granularity):
         if label == "Title" and not title:
-            title = block["text"]
+            title = text
         elif label in ("H1", "H2", "H3"):
             outline.append({
                 "level": label,
-                "text": block["text"],
-                "page": block["page"]
+                "text": text,
+                "page": page
             })
     return {
         "title": title if title else "",
         "outline": outline
     }
 
-def main(input_dir="/app/input", output_dir="/app/output", model_path="heading_classifier.joblib"):
+def load_model(model_path):
+    """Load a compiled ``.npz`` model with NumPy alone, or a joblib model via scikit-learn."""
+    if model_path.endswith(".npz"):
+        return CompiledForest.load(model_path)
+    import joblib
+    return joblib.load(model_path)
+
+def build_options(model_path, page_window=DEFAULT_PAGE_WINDOW, cache_dir=None,
+                  cache_max_bytes=DEFAULT_MAX_BYTES, use_toc=True, granularity=DEFAULT_GRANULARITY):
+    """Keyword arguments for ``process_pdf`` shared by batch and watch mode."""
+    cache = None
+    if cache_dir:
+        # Settings that change the outline are part of the cache key
+        cache = OutlineCache(cache_dir, model_path, cache_max_bytes,
+                             variant=f"toc={use_toc},granularity={granularity}")
+    return {
+        "page_window": page_window,
+        "cache": cache,
+        "use_toc": use_toc,
+        "granularity": granularity,
+    }
+
+_worker_model = None
+
+def _init_worker(model_path):
+    """Load the classifier once per worker process (no-op if inherited via fork)."""
+    global _worker_model
+    # Workers start with empty metrics, so their snapshots hold only their own work
+    metrics.reset()
+    if _worker_model is None:
+        _worker_model = load_model(model_path)
+
+def output_path(pdf_path, output_dir):
+    out_name = os.path.splitext(os.path.basename(pdf_path))[0] + ".json"
+    return os.path.join(output_dir, out_name)
+
+def _process_file(pdf_path, output_dir, options):
+    """Process one PDF with the worker's model and write its JSON next to the others."""
+    result = process_pdf(pdf_path, _worker_model, **options)
+    out_path = output_path(pdf_path, output_dir)
+    with metrics.span("write_json"):
+        save_json(result, out_path)
+    metrics.count("pdfs")
+    return out_path
+
+def _measured(fn, *args):
+    """Run ``fn`` in a worker process and return its result with the worker's metrics."""
+    return fn(*args), metrics.snapshot()
+
+def _run_shard_worker(shard_dir, lease_seconds, input_dir, output_dir, options):
+    """Claim PDFs from the shard manifest and process them until it is finished."""
+    def process(name):
+        out_path = _process_file(os.path.join(input_dir, name), output_dir, options)
+        print(f"Saved result to: {out_path}")
+        return True
+    return run_worker(ShardQueue(shard_dir, lease_seconds=lease_seconds), process)
+
+def process_sharded(pdf_paths, input_dir, output_dir, model_path, workers, options, shard_dir,
+                    lease_seconds=DEFAULT_LEASE_SECONDS, retry_failed=False):
+    """
+    Share the PDFs with workers on other machines through ``shard_dir``:
+    claim them from a common manifest (largest first), process until every PDF
+    is finished, and print the merged report. PDFs that failed in an earlier
+    run are skipped unless ``retry_failed`` is set.
+    """
+    pdf_paths = sorted(pdf_paths, key=os.path.getsize, reverse=True)
+    shard_queue = ShardQueue(shard_dir, [os.path.basename(p) for p in pdf_paths], lease_seconds)
+    if retry_failed:
+        shard_queue.reset_failed()
+    print(f"Shard directory: {shard_dir} ({len(shard_queue.items)} PDFs in manifest, "
+          f"{shard_queue.pending()} pending)")
+    args = (shard_dir, lease_seconds, input_dir, output_dir, options)
+    if workers == 1:
+        _run_shard_worker(*args)
+    else:
+        # Each worker process is an independent shard worker
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(model_path,)) as pool:
+            for future in [pool.submit(_measured, _run_shard_worker, *args) for _ in range(workers)]:
+                metrics.merge(future.result()[1])
+    report = shard_queue.write_report()
+    print(f"\nShard progress: {report['done']}/{report['total']} done, {report['failed']} failed, "
+          f"{report['in_progress']} in progress elsewhere")
+    for worker, counts in sorted(report["workers"].items()):
+        print(f"  {worker}: {counts['done']} done, {counts['failed']} failed, {counts['seconds']:.2f} seconds")
+    if report.get("items_per_minute"):
+        print(f"Throughput: {report['items_per_minute']:.2f} PDFs/minute")
+    print(f"Report written to {os.path.join(shard_dir, 'report.json')}")
+
+def main(input_dir="/app/input", output_dir="/app/output", model_path="heading_classifier.joblib", workers=None,
+         page_window=DEFAULT_PAGE_WINDOW, cache_dir=None, cache_max_bytes=DEFAULT_MAX_BYTES,
+         use_toc=True, granularity=DEFAULT_GRANULARITY, shard_dir=None, lease_seconds=DEFAULT_LEASE_SECONDS,
+         retry_failed=False):
+    global _worker_model
     print(f"Starting PDF processing...")
     print(f"Input directory: {input_dir}")
     print(f"Output directory: {output_dir}")
@@ -53,29 +180,115 @@ def main(input_dir="/app/input", output_dir="/app/output", model_path="heading_c
     
     # Load model
     try:
-        model = joblib.load(model_path)
+        _worker_model = load_model(model_path)
         print("Model loaded successfully")
     except Exception as e:
         print(f"ERROR loading model: {e}")
         return
     
+    options = build_options(model_path, page_window, cache_dir, cache_max_bytes, use_toc, granularity)
+    if cache_dir:
+        print(f"Result cache: {cache_dir}")
+    
     # Create output directory if it doesn't exist
     os.makedirs(output_dir, exist_ok=True)
     print(f"Output directory created/verified: {output_dir}")
     
+    pdf_paths = [os.path.join(input_dir, f) for f in files if f.lower().endswith(".pdf")]
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(pdf_paths) or 1))
+    print(f"Workers: {workers}")
+    
+    if shard_dir:
+        process_sharded(pdf_paths, input_dir, output_dir, model_path, workers, options, shard_dir, lease_seconds,
+                        retry_failed)
+        return
+    
     pdf_count = 0
-    for fname in files:
-        if fname.lower().endswith(".pdf"):
+    failed = 0
+    if workers == 1:
+        for pdf_path in pdf_paths:
             pdf_count += 1
-            print(f"\nProcessing PDF {pdf_count}: {fname}")
-            pdf_path = os.path.join(input_dir, fname)
-            result = process_pdf(pdf_path, model)
-            out_name = os.path.splitext(fname)[0] + ".json"
-            out_path = os.path.join(output_dir, out_name)
-            save_json(result, out_path)
-            print(f"Saved result to: {out_path}")
+            print(f"\nProcessing PDF {pdf_count}: {os.path.basename(pdf_path)}")
+            try:
+                out_path = _process_file(pdf_path, output_dir, options)
+                print(f"Saved result to: {out_path}")
+            except Exception as e:
+                failed += 1
+                print(f"ERROR processing {pdf_path}: {e}")
+    else:
+        # Workers forked after the model is loaded share it; other start methods
+        # load it once per worker in the initializer.
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(model_path,)) as pool:
+            futures = {pool.submit(_measured, _process_file, p, output_dir, options): p for p in pdf_paths}
+            for future in as_completed(futures):
+                pdf_count += 1
+                pdf_path = futures[future]
+                try:
+                    out_path, worker_metrics = future.result()
+                    metrics.merge(worker_metrics)
+                    print(f"[{pdf_count}/{len(pdf_paths)}] Saved result to: {out_path}")
+                except Exception as e:
+                    failed += 1
+                    print(f"[{pdf_count}/{len(pdf_paths)}] ERROR processing {pdf_path}: {e}")
     
-    print(f"\nProcessing complete! Processed {pdf_count} PDF files.")
+    print(f"\nProcessing complete! Processed {pdf_count - failed} PDF files ({failed} failed).")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description="Extract heading outlines from PDFs")
+    parser.add_argument("--input-dir", default="/app/input", help="Folder containing input PDFs")
+    parser.add_argument("--output-dir", default="/app/output", help="Folder for output JSON files")
+    parser.add_argument("--model", default="heading_classifier.joblib", help="Path to the heading classifier")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Number of worker processes (default: CPU count)")
+    parser.add_argument("--page-window", type=int, default=DEFAULT_PAGE_WINDOW,
+                        help="Pages featurized and classified at a time (bounds peak memory)")
+    parser.add_argument("--cache-dir", default=None,
+                        help="Reuse outlines of unchanged PDFs from this cache folder")
+    parser.add_argument("--cache-max-mb", type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024),
+                        help="Evict least recently used cache entries beyond this size")
+    parser.add_argument("--no-toc", action="store_true",
+                        help="Always run the classifier, even for PDFs with embedded bookmarks")
+    parser.add_argument("--granularity", choices=GRANULARITIES, default=DEFAULT_GRANULARITY,
+                        help="Classify individual spans, whole lines, or merged same-style line blocks")
+    parser.add_argument("--shard-dir", default=None,
+                        help="Share the input PDFs with workers on other machines through this directory")
+    parser.add_argument("--lease-seconds", type=int, default=DEFAULT_LEASE_SECONDS,
+                        help="Reclaim PDFs whose worker has not renewed its lease for this long")
+    parser.add_argument("--retry-failed", action="store_true", help="Retry PDFs that failed in the shard")
+    parser.add_argument("--metrics", default=None,
+                        help="Write per-stage timings, counters and peak memory to this JSON file")
+    parser.add_argument("--profile", action="store_true",
+                        help="With --metrics, also run cProfile and save its stats next to the metrics file")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="With --metrics, also track peak Python allocations with tracemalloc (slower)")
+    parser.add_argument("--watch", action="store_true",
+                        help="Keep running and process PDFs as they arrive in the input directory")
+    parser.add_argument("--watch-threads", type=int, default=1, help="Worker threads in watch mode")
+    parser.add_argument("--poll-interval", type=float, default=1.0,
+                        help="Rescan interval in seconds when inotify is unavailable")
+    parser.add_argument("--no-inotify", action="store_true", help="Always poll the input directory in watch mode")
+    parser.add_argument("--stats-file", default=None, help="Write watch-mode counters to this JSON file")
+    args = parser.parse_args()
+    if args.page_window < 1:
+        parser.error("--page-window must be at least 1")
+    if args.metrics:
+        metrics.enable(profile=args.profile, trace_memory=args.trace_memory)
+    if args.watch:
+        from watcher import run_watch
+        options = build_options(args.model, args.page_window, args.cache_dir,
+                                args.cache_max_mb * 1024 * 1024, not args.no_toc, args.granularity)
+        run_watch(args.input_dir, args.output_dir, args.model, options, args.watch_threads,
+                  args.poll_interval, stats_path=args.stats_file, use_inotify=not args.no_inotify)
+        if args.metrics:
+            metrics.write(args.metrics, {"pipeline": "challenge_1a", "mode": "watch"})
+        raise SystemExit(0)
+    main(args.input_dir, args.output_dir, args.model, args.workers, args.page_window,
+         args.cache_dir, args.cache_max_mb * 1024 * 1024, not args.no_toc, args.granularity,
+         args.shard_dir, args.lease_seconds, args.retry_failed)
+    if args.metrics:
+        metrics.write(args.metrics, {"pipeline": "challenge_1a", "mode": "batch"})
+        print(f"Metrics written to {args.metrics}")
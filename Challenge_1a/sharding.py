@@ -0,0 +1,336 @@
+import hashlib
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+
+# A lease not renewed for this long is considered abandoned and may be reclaimed
+DEFAULT_LEASE_SECONDS = 600
+# How often idle workers re-check for claimable items
+DEFAULT_POLL_SECONDS = 5
+# How often a busy worker rewrites report.json (it reads every marker and lease)
+DEFAULT_REPORT_SECONDS = 30
+
+def default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+def _write_json(path, data):
+    """Write JSON via temp file + rename so other nodes never read a partial file."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.chmod(tmp_path, 0o644)
+    os.replace(tmp_path, path)
+
+def _read_json(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+class ShardQueue:
+    """
+    Work queue over a directory shared by several workers (processes or
+    machines), with no broker.
+
+    ``manifest.json`` lists the items; the first worker to start writes it and
+    later ones reuse it. A worker claims an item by creating
+    ``leases/<key>.lease`` with ``O_EXCL``, renews it while working, and on
+    completion writes ``done/<key>.json`` and drops the lease. Leases that
+    have expired (their worker crashed or hung) are reclaimed by renaming them
+    away first, so only one worker wins. The claiming worker keeps its lease
+    file open and renews and releases through that handle, so it never
+    touches a lease another worker has since reclaimed. Items with a done marker are skipped,
+    so a restarted batch resumes where it stopped. Lease expiry compares wall
+    clocks, so nodes' clocks should agree to well within ``lease_seconds``.
+    """
+
+    def __init__(self, shard_dir, items=None, lease_seconds=DEFAULT_LEASE_SECONDS, worker_id=None):
+        self.dir = shard_dir
+        self.lease_seconds = lease_seconds
+        self.worker_id = worker_id or default_worker_id()
+        # item -> open descriptor of the lease file this worker created
+        self._held = {}
+        # Items known to have a done marker, and how many leading manifest
+        # items are done, so claims don't re-check finished items
+        self._done = set()
+        self._cursor = 0
+        self.lease_dir = os.path.join(shard_dir, "leases")
+        self.done_dir = os.path.join(shard_dir, "done")
+        os.makedirs(self.lease_dir, exist_ok=True)
+        os.makedirs(self.done_dir, exist_ok=True)
+        self.manifest_path = os.path.join(shard_dir, "manifest.json")
+        manifest = _read_json(self.manifest_path)
+        if manifest is None:
+            if items is None:
+                raise FileNotFoundError(f"No manifest in {shard_dir}")
+            try:
+                # O_EXCL: exactly one worker creates the manifest
+                fd = os.open(self.manifest_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump({"items": list(items), "created": time.time()}, f, indent=2, ensure_ascii=False)
+            except FileExistsError:
+                pass
+            manifest = None
+            while manifest is None:  # another worker may still be writing it
+                manifest = _read_json(self.manifest_path)
+                if manifest is None:
+                    time.sleep(0.1)
+        self.items = manifest["items"]
+
+    @staticmethod
+    def key(item):
+        return hashlib.sha1(item.encode("utf-8")).hexdigest()
+
+    def _lease_path(self, item):
+        return os.path.join(self.lease_dir, self.key(item) + ".lease")
+
+    def _done_path(self, item):
+        return os.path.join(self.done_dir, self.key(item) + ".json")
+
+    def is_done(self, item):
+        if item in self._done:
+            return True
+        if os.path.exists(self._done_path(item)):
+            self._done.add(item)  # markers are only removed by reset_failed
+            return True
+        return False
+
+    def _lease(self):
+        now = time.time()
+        return {"worker": self.worker_id, "claimed": now, "expires": now + self.lease_seconds}
+
+    def _write_lease(self, fd, item):
+        # Rewritten in place so the file keeps its identity; a reader racing
+        # the write sees unparseable JSON and falls back to the mtime
+        data = json.dumps({**self._lease(), "item": item}).encode("utf-8")
+        os.pwrite(fd, data, 0)
+        os.ftruncate(fd, len(data))
+
+    def _expires(self, path):
+        """Expiry time of the lease at ``path`` (None if there is none) and its contents."""
+        lease = _read_json(path)
+        if lease is not None:
+            return lease.get("expires", 0), lease
+        try:
+            return os.stat(path).st_mtime + self.lease_seconds, None
+        except OSError:
+            return None, None
+
+    def _try_create_lease(self, item):
+        try:
+            fd = os.open(self._lease_path(item), os.O_CREAT | os.O_EXCL | os.O_RDWR, 0o644)
+        except FileExistsError:
+            return False
+        self._write_lease(fd, item)
+        self._held[item] = fd
+        return True
+
+    def holds(self, item):
+        """True if the lease file for ``item`` is still the one this worker created."""
+        fd = self._held.get(item)
+        if fd is None:
+            return False
+        try:
+            st = os.stat(self._lease_path(item))
+        except OSError:
+            return False
+        held = os.fstat(fd)
+        return (st.st_dev, st.st_ino) == (held.st_dev, held.st_ino)
+
+    def _reclaim_if_expired(self, item):
+        """Remove an expired lease; only the worker whose rename succeeds removes it."""
+        path = self._lease_path(item)
+        expires, _ = self._expires(path)
+        if expires is None or expires > time.time():
+            return False
+        stale = f"{path}.{self.worker_id}.stale"
+        try:
+            os.rename(path, stale)
+        except OSError:
+            return False  # another worker reclaimed or renewed it first
+        expires, lease = self._expires(stale)
+        if expires is not None and expires > time.time():
+            # Renewed between our check and the rename: put it back unless already replaced
+            try:
+                os.link(stale, path)
+            except OSError:
+                pass
+            os.remove(stale)
+            return False
+        os.remove(stale)
+        print(f"Reclaimed expired lease on {item} from {lease.get('worker') if lease else 'unknown'}")
+        return True
+
+    def claim(self):
+        """Claim the next unfinished, unleased item, or return None if there is none right now."""
+        while self._cursor < len(self.items) and self.is_done(self.items[self._cursor]):
+            self._cursor += 1
+        for item in self.items[self._cursor:]:
+            if self.is_done(item):
+                continue
+            if self._try_create_lease(item):
+                if self.is_done(item):  # finished by another worker just before we leased it
+                    self.release(item)
+                    continue
+                return item
+            if self._reclaim_if_expired(item) and self._try_create_lease(item):
+                return item
+        return None
+
+    def renew(self, item):
+        """Push the lease's expiry forward; returns False if we no longer hold it."""
+        if not self.holds(item):
+            return False
+        # Writes through our own descriptor: if the lease was reclaimed in the
+        # meantime this only updates the orphaned file, never the new lease
+        self._write_lease(self._held[item], item)
+        return self.holds(item)
+
+    def release(self, item):
+        """Drop our lease on ``item``; a lease another worker has taken over is left alone."""
+        if not self.holds(item):
+            fd = self._held.pop(item, None)
+            if fd is not None:
+                os.close(fd)
+            return False
+        fd = self._held.pop(item)
+        path = self._lease_path(item)
+        moved = f"{path}.{self.worker_id}.release"
+        try:
+            os.rename(path, moved)
+        except OSError:
+            os.close(fd)
+            return False
+        st, held = os.stat(moved), os.fstat(fd)
+        os.close(fd)
+        ours = (st.st_dev, st.st_ino) == (held.st_dev, held.st_ino)
+        if not ours:
+            # Took another worker's lease away: put it back unless already replaced
+            try:
+                os.link(moved, path)
+            except OSError:
+                pass
+        os.remove(moved)
+        return ours
+
+    def complete(self, item, ok, started, extra=None):
+        """
+        Record ``item`` as finished (successfully or not) and drop its lease.
+        Returns False without writing the done marker if the lease was lost.
+        """
+        if not self.holds(item):
+            self.release(item)
+            return False
+        finished = time.time()
+        _write_json(self._done_path(item), {
+            "item": item,
+            "ok": bool(ok),
+            "worker": self.worker_id,
+            "started": started,
+            "finished": finished,
+            "seconds": finished - started,
+            **(extra or {})
+        })
+        self._done.add(item)
+        self.release(item)
+        return True
+
+    def reset_failed(self):
+        """Drop done markers of failed items so they are retried."""
+        for item in self.items:
+            marker = _read_json(self._done_path(item))
+            if marker is not None and not marker.get("ok"):
+                os.remove(self._done_path(item))
+                self._done.discard(item)
+        self._cursor = 0
+
+    def pending(self):
+        return sum(1 for item in self.items if not self.is_done(item))
+
+    def report(self):
+        """Merged progress and throughput over every worker's done markers and live leases."""
+        markers = [m for m in (_read_json(self._done_path(item)) for item in self.items) if m is not None]
+        now = time.time()
+        leases = [l for l in (_read_json(self._lease_path(item)) for item in self.items) if l is not None]
+        workers = {}
+        for m in markers:
+            w = workers.setdefault(m["worker"], {"done": 0, "failed": 0, "seconds": 0.0})
+            w["done" if m["ok"] else "failed"] += 1
+            w["seconds"] += m["seconds"]
+        report = {
+            "total": len(self.items),
+            "done": sum(1 for m in markers if m["ok"]),
+            "failed": sum(1 for m in markers if not m["ok"]),
+            "in_progress": sum(1 for l in leases if l.get("expires", 0) > now),
+            "pending": len(self.items) - len(markers),
+            "workers": workers,
+            "updated": now,
+        }
+        if markers:
+            elapsed = max(m["finished"] for m in markers) - min(m["started"] for m in markers)
+            report["elapsed_seconds"] = elapsed
+            report["items_per_minute"] = len(markers) / elapsed * 60 if elapsed > 0 else None
+        return report
+
+    def write_report(self):
+        report = self.report()
+        _write_json(os.path.join(self.dir, "report.json"), report)
+        return report
+
+def run_worker(shard_queue, process_fn, poll_seconds=DEFAULT_POLL_SECONDS, log=print,
+               report_seconds=DEFAULT_REPORT_SECONDS):
+    """
+    Claim and process items until every item in the manifest is finished.
+    ``process_fn(item)`` returns True on success; a background thread renews
+    the lease while it runs. An item whose lease was lost meanwhile is left to
+    the worker that reclaimed it. When all remaining items are leased by other
+    workers, waits and re-checks so expired leases get picked up.
+    ``report.json`` is rewritten every ``report_seconds`` and on exit. Returns
+    the number of items this worker processed.
+    """
+    processed = 0
+    reported = time.time()
+    while True:
+        item = shard_queue.claim()
+        if item is None:
+            if not shard_queue.pending():
+                break
+            time.sleep(poll_seconds)
+            continue
+        stop = threading.Event()
+        lost = threading.Event()
+
+        def heartbeat():
+            while not stop.wait(shard_queue.lease_seconds / 3):
+                if not shard_queue.renew(item):
+                    log(f"WARNING: lost lease on {item}")
+                    lost.set()
+                    return
+
+        renewer = threading.Thread(target=heartbeat, daemon=True)
+        renewer.start()
+        started = time.time()
+        try:
+            ok = process_fn(item)
+        except Exception as e:
+            log(f"ERROR processing {item}: {e}")
+            ok = False
+        finally:
+            stop.set()
+            renewer.join()
+        if lost.is_set() or not shard_queue.complete(item, ok, started):
+            shard_queue.release(item)
+            log(f"WARNING: lease on {item} was lost; not recording it as done")
+            continue
+        processed += 1
+        if time.time() - reported >= report_seconds:
+            shard_queue.write_report()
+            reported = time.time()
+    report = shard_queue.write_report()
+    log(f"Shard worker {shard_queue.worker_id} finished: processed {processed} items; "
+        f"{report['done']}/{report['total']} done, {report['failed']} failed overall")
+    return processed
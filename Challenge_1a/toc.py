@@ -0,0 +1,80 @@
+import re
+import fitz
+
+# Bookmark depth -> outline level; deeper bookmarks are dropped
+TOC_LEVELS = {1: "H1", 2: "H2", 3: "H3"}
+
+# Fewer bookmarks than this is not treated as a real outline
+MIN_TOC_ENTRIES = 2
+
+# Metadata titles that are really file names or authoring-tool artifacts
+JUNK_TITLE = re.compile(r"(\.(pdf|docx?|pptx?|xlsx?|txt|cdr|indd|ai|psd)$)|(^microsoft\s+\w+\s*-)|(^untitled)", re.IGNORECASE)
+
+def detect_title(doc):
+    """Title from document metadata, else the largest-font line of page 1."""
+    title = " ".join((doc.metadata or {}).get("title", "").split())
+    if title and not JUNK_TITLE.search(title):
+        return title
+    if doc.page_count == 0:
+        return ""
+    best_size = 0.0
+    best_lines = []
+    for block in doc.load_page(0).get_text("dict")["blocks"]:
+        if block["type"] != 0:  # text block
+            continue
+        for line in block["lines"]:
+            text = " ".join(span["text"].strip() for span in line["spans"] if span["text"].strip())
+            if not text:
+                continue
+            size = max(span["size"] for span in line["spans"])
+            if size > best_size + 0.5:
+                best_size, best_lines = size, [text]
+            elif abs(size - best_size) <= 0.5:
+                best_lines.append(text)
+    return " ".join(best_lines[:2])
+
+def _normalize(text):
+    return " ".join(text.split()).casefold()
+
+def outline_from_toc(pdf_path):
+    """
+    Build the outline from the PDF's embedded bookmarks.
+
+    Returns None unless the bookmarks look trustworthy: enough entries, depth
+    starting at 1 and never skipping a level, every target page inside the
+    document, and pages in reading order. A single root bookmark is taken to
+    be the document title: it is dropped and its children move up one level
+    if it matches the detected title, and the classifier is used otherwise.
+    """
+    with fitz.open(pdf_path) as doc:
+        toc = doc.get_toc(simple=True)
+        if len(toc) < MIN_TOC_ENTRIES or toc[0][0] != 1:
+            return None
+        title = detect_title(doc)
+        roots = [entry for entry in toc if entry[0] == 1]
+        if len(roots) == 1:
+            if _normalize(roots[0][1]) != _normalize(title):
+                return None
+            toc = [[level - 1, text, page] for level, text, page in toc[1:]]
+            if len(toc) < MIN_TOC_ENTRIES or toc[0][0] != 1:
+                return None
+        outline = []
+        prev_level = 0
+        prev_page = 1
+        for level, text, page in toc:
+            text = " ".join(text.split())
+            if not text or level > prev_level + 1:
+                return None
+            if not 1 <= page <= doc.page_count or page < prev_page:
+                return None
+            prev_level, prev_page = level, page
+            if level in TOC_LEVELS:
+                outline.append({
+                    "level": TOC_LEVELS[level],
+                    "text": text,
+                    "page": page
+                })
+        return {
+            "title": title,
+            "outline": outline
+        }
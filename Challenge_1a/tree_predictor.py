@@ -0,0 +1,58 @@
+import numpy as np
+
+class CompiledForest:
+    """
+    NumPy-only predictor for a tree ensemble exported by ``export_model.py``.
+
+    All trees live in one set of flat node arrays; ``roots`` holds the index of
+    each tree's root node and leaves have ``left == -1``. ``value`` stores each
+    leaf's normalized class distribution, so averaging it over trees reproduces
+    scikit-learn's ``predict_proba`` and therefore its ``predict``.
+    """
+
+    def __init__(self, classes, roots, left, right, feature, threshold, value, n_features):
+        self.classes = classes
+        self.roots = roots
+        self.left = left
+        self.right = right
+        self.feature = feature
+        self.threshold = threshold
+        self.value = value
+        self.n_features = int(n_features)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(**{name: data[name] for name in data.files})
+
+    def save(self, path):
+        np.savez_compressed(
+            path, classes=self.classes, roots=self.roots, left=self.left, right=self.right,
+            feature=self.feature, threshold=self.threshold, value=self.value,
+            n_features=self.n_features,
+        )
+
+    def _leaves(self, X, root):
+        """Leaf index reached by every row of ``X`` in the tree rooted at ``root``."""
+        rows = np.arange(len(X))
+        node = np.full(len(X), root, dtype=np.int64)
+        active = rows[self.left[node] != -1]
+        while len(active):
+            n = node[active]
+            go_left = X[active, self.feature[n]] <= self.threshold[n]
+            node[active] = np.where(go_left, self.left[n], self.right[n])
+            active = active[self.left[node[active]] != -1]
+        return node
+
+    def predict_proba(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"Expected input of shape (n, {self.n_features}), got {X.shape}")
+        proba = np.zeros((len(X), len(self.classes)), dtype=np.float64)
+        for root in self.roots:
+            proba += self.value[self._leaves(X, root)]
+        proba /= len(self.roots)
+        return proba
+
+    def predict(self, X):
+        return self.classes[np.argmax(self.predict_proba(X), axis=1)]
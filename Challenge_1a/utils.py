@@ -1,11 +1,22 @@
 import json
 import os
+import tempfile
 
 def save_json(data, path):
+    """Write ``data`` to ``path`` atomically; raises if the write fails."""
     print(f"Attempting to save JSON to: {path}")
     try:
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        # Write to a temp file in the same folder and rename it into place so
+        # readers never see a partially written JSON.
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
         print(f"Successfully saved JSON to: {path}")
         # Verify the file was created
         if os.path.exists(path):
@@ -14,7 +25,9 @@ def save_json(data, path):
         else:
             print(f"ERROR: File does not exist after saving: {path}")
     except Exception as e:
+        # Re-raised so batch and watch mode count the file as failed
         print(f"ERROR saving JSON to {path}: {e}")
+        raise
 
 def load_json(path):
     with open(path, "r", encoding="utf-8") as f:
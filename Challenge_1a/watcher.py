@@ -0,0 +1,244 @@
+import ctypes
+import ctypes.util
+import json
+import os
+import queue
+import select
+import signal
+import struct
+import threading
+import time
+
+import metrics
+from process_pdfs import load_model, output_path, process_pdf
+from utils import save_json
+
+# inotify event masks (linux/inotify.h)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_EVENT_HEADER = struct.Struct("iIII")
+
+DEFAULT_POLL_INTERVAL = 1.0
+DEFAULT_STATS_INTERVAL = 10.0
+
+def is_pdf(name):
+    return name.lower().endswith(".pdf")
+
+def file_signature(path):
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+class InotifyWatcher:
+    """Report PDFs that finished being written or were moved into a folder (Linux only)."""
+
+    def __init__(self, directory):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.directory = directory
+        self.fd = libc.inotify_init1(os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        wd = libc.inotify_add_watch(self.fd, os.fsencode(directory), IN_CLOSE_WRITE | IN_MOVED_TO)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"inotify_add_watch failed for {directory}")
+
+    def poll(self, timeout):
+        """Return the PDF paths that changed, waiting at most ``timeout`` seconds."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        data = os.read(self.fd, 64 * 1024)
+        paths = []
+        offset = 0
+        while offset < len(data):
+            _, _, _, name_len = IN_EVENT_HEADER.unpack_from(data, offset)
+            offset += IN_EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + name_len].rstrip(b"\0"))
+            offset += name_len
+            if is_pdf(name):
+                paths.append(os.path.join(self.directory, name))
+        return paths
+
+    def close(self):
+        os.close(self.fd)
+
+class PollingWatcher:
+    """
+    Portable fallback: rescan the folder every ``interval`` seconds and report
+    PDFs whose size/mtime changed and then stayed the same for one scan, so
+    files still being copied in are not picked up half-written.
+    """
+
+    def __init__(self, directory, interval=DEFAULT_POLL_INTERVAL):
+        self.directory = directory
+        self.interval = interval
+        self.seen = {}
+        self.pending = {}
+
+    def poll(self, timeout):
+        time.sleep(min(timeout, self.interval))
+        paths = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not is_pdf(entry.name) or not entry.is_file():
+                    continue
+                st = entry.stat()
+                sig = (st.st_mtime_ns, st.st_size)
+                if self.seen.get(entry.path) == sig:
+                    continue
+                if self.pending.get(entry.path) == sig:
+                    self.seen[entry.path] = sig
+                    del self.pending[entry.path]
+                    paths.append(entry.path)
+                else:
+                    self.pending[entry.path] = sig
+        return paths
+
+    def close(self):
+        pass
+
+def open_watcher(directory, poll_interval=DEFAULT_POLL_INTERVAL, use_inotify=True):
+    if use_inotify:
+        try:
+            return InotifyWatcher(directory)
+        except (OSError, AttributeError, TypeError) as e:
+            print(f"inotify unavailable ({e}); polling every {poll_interval}s")
+    return PollingWatcher(directory, poll_interval)
+
+class WatchStats:
+    """Thread-safe throughput and queue-depth counters for the watch daemon."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.processed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self.last_latency = 0.0
+
+    def record(self, ok, seconds, latency):
+        with self.lock:
+            if ok:
+                self.processed += 1
+            else:
+                self.failed += 1
+            self.busy_seconds += seconds
+            self.last_latency = latency
+
+    def snapshot(self, queue_depth):
+        with self.lock:
+            uptime = time.time() - self.started
+            done = self.processed + self.failed
+            return {
+                "uptime_seconds": round(uptime, 3),
+                "processed": self.processed,
+                "failed": self.failed,
+                "queue_depth": queue_depth,
+                "files_per_second": round(done / uptime, 3) if uptime else 0.0,
+                "mean_processing_seconds": round(self.busy_seconds / done, 4) if done else 0.0,
+                "last_latency_seconds": round(self.last_latency, 4),
+            }
+
+def needs_processing(pdf_path, output_dir):
+    """True if the PDF has no output yet or changed after its output was written."""
+    out_path = output_path(pdf_path, output_dir)
+    try:
+        return os.stat(out_path).st_mtime_ns < os.stat(pdf_path).st_mtime_ns
+    except FileNotFoundError:
+        return True
+
+def run_watch(input_dir, output_dir, model_path, options, threads=1,
+              poll_interval=DEFAULT_POLL_INTERVAL, stats_interval=DEFAULT_STATS_INTERVAL,
+              stats_path=None, use_inotify=True, stop_event=None):
+    """
+    Keep the classifier loaded and process PDFs as they land in ``input_dir``.
+
+    PDFs that are new or newer than their output are queued on startup; after
+    that only files reported by the watcher are processed. Outputs are written
+    atomically by ``save_json``. Throughput and queue-depth counters are printed
+    every ``stats_interval`` seconds and, if ``stats_path`` is set, written there.
+    """
+    model = load_model(model_path)
+    os.makedirs(output_dir, exist_ok=True)
+    stop_event = stop_event or threading.Event()
+    stats = WatchStats()
+    work = queue.Queue()
+    pending = set()
+    pending_lock = threading.Lock()
+
+    def enqueue(pdf_path):
+        with pending_lock:
+            if pdf_path in pending:
+                return
+            pending.add(pdf_path)
+        work.put((pdf_path, time.time()))
+
+    def worker():
+        while True:
+            item = work.get()
+            if item is None:
+                return
+            pdf_path, queued_at = item
+            with pending_lock:
+                pending.discard(pdf_path)
+            start = time.time()
+            ok = True
+            try:
+                result = process_pdf(pdf_path, model, **options)
+                with metrics.span("write_json"):
+                    save_json(result, output_path(pdf_path, output_dir))
+            except Exception as e:
+                ok = False
+                print(f"ERROR processing {pdf_path}: {e}")
+            end = time.time()
+            stats.record(ok, end - start, end - queued_at)
+
+    def report():
+        snapshot = stats.snapshot(work.qsize())
+        print(f"[watch] {json.dumps(snapshot)}")
+        if stats_path:
+            try:
+                save_json(snapshot, stats_path)
+            except OSError:
+                pass  # already reported; keep watching
+
+    if threading.current_thread() is threading.main_thread():
+        # Container stop sends SIGTERM; drain and report instead of dying mid-write
+        signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+
+    watcher = open_watcher(input_dir, poll_interval, use_inotify)
+    print(f"Watching {input_dir} with {type(watcher).__name__} ({threads} worker thread(s))")
+    workers = [threading.Thread(target=worker, daemon=True) for _ in range(max(1, threads))]
+    for t in workers:
+        t.start()
+
+    for name in sorted(os.listdir(input_dir)):
+        pdf_path = os.path.join(input_dir, name)
+        if is_pdf(name) and needs_processing(pdf_path, output_dir):
+            enqueue(pdf_path)
+    if isinstance(watcher, PollingWatcher):
+        # Files already present were handled by the startup scan
+        for name in os.listdir(input_dir):
+            if is_pdf(name):
+                pdf_path = os.path.join(input_dir, name)
+                watcher.seen[pdf_path] = file_signature(pdf_path)
+
+    next_report = time.time() + stats_interval
+    try:
+        while not stop_event.is_set():
+            for pdf_path in watcher.poll(min(poll_interval, max(0.0, next_report - time.time()))):
+                if os.path.exists(pdf_path):
+                    enqueue(pdf_path)
+            if time.time() >= next_report:
+                report()
+                next_report = time.time() + stats_interval
+    except KeyboardInterrupt:
+        print("Stopping watch mode...")
+    finally:
+        watcher.close()
+        for _ in workers:
+            work.put(None)
+        for t in workers:
+            t.join()
+        report()
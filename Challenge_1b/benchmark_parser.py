@@ -0,0 +1,111 @@
+import argparse
+import glob
+import json
+import os
+import re
+import time
+import fitz
+
+from pdf_parser import clean_title, is_likely_dish_name, segment_lines
+
+def legacy_segment_lines(lines):
+    """The previous per-title rescanning segmentation, kept only as a benchmark baseline."""
+    sections = []
+    potential_titles = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if (re.match(r'^[A-Z][A-Za-z\s\-\'&,]{2,50}$', line) and len(line) > 3 and len(line) < 100):
+            potential_titles.append(line)
+        elif is_likely_dish_name(line):
+            potential_titles.append(line)
+        elif re.match(r'^\d+\.\s+[A-Za-z]', line):
+            potential_titles.append(line)
+        elif re.match(r'^[A-Z][A-Za-z\s]{3,}$', line):
+            potential_titles.append(line)
+    for i, title in enumerate(potential_titles):
+        if title.lower() in ['ingredients', 'instructions', 'directions', 'preparation',
+                             'cooking time', 'servings', 'nutrition', 'tips', 'notes']:
+            continue
+        clean_title_text = clean_title(title)
+        if not clean_title_text or len(clean_title_text) < 3:
+            continue
+        section_text = []
+        start_collecting = False
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            if title in line and not start_collecting:
+                start_collecting = True
+                continue
+            if start_collecting and any(potential_titles[j] in line for j in range(i + 1, len(potential_titles))):
+                break
+            if start_collecting and line != title:
+                section_text.append(line)
+        if section_text and len('\n'.join(section_text).strip()) > 20:
+            sections.append((clean_title_text, '\n'.join(section_text)))
+    return sections
+
+def page_lines(pdf_path):
+    with fitz.open(pdf_path) as doc:
+        return [page.get_text("text").split("\n") for page in doc]
+
+def dense_page(n_sections, lines_per_section=4):
+    """A synthetic page with many short titled sections, the worst case for rescanning."""
+    lines = []
+    for i in range(n_sections):
+        lines.append(f"Section Heading {chr(65 + i % 26)}{chr(65 + i // 26 % 26)}")
+        lines.extend(f"body line {j} of section {i} with enough words to be content." for j in range(lines_per_section))
+    return lines
+
+def time_segmentation(fn, pages, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        sections = [sec for lines in pages for sec in fn(lines)]
+        best = min(best, time.perf_counter() - start)
+    return best, sections
+
+def compare(name, pages, repeat):
+    legacy_seconds, legacy = time_segmentation(legacy_segment_lines, pages, repeat)
+    new_seconds, new = time_segmentation(segment_lines, pages, repeat)
+    row = {
+        "input": name,
+        "lines": sum(len(lines) for lines in pages),
+        "legacy_seconds": round(legacy_seconds, 5),
+        "single_pass_seconds": round(new_seconds, 5),
+        "speedup": round(legacy_seconds / max(new_seconds, 1e-9), 1),
+        "legacy_sections": len(legacy),
+        "single_pass_sections": len(new),
+        "legacy_text_chars": sum(len(text) for _, text in legacy),
+        "single_pass_text_chars": sum(len(text) for _, text in new),
+    }
+    print(f"{name}: {row['lines']} lines, legacy {legacy_seconds:.4f}s -> single pass {new_seconds:.4f}s "
+          f"({row['speedup']}x), sections {len(legacy)} -> {len(new)}, "
+          f"text {row['legacy_text_chars']} -> {row['single_pass_text_chars']} chars")
+    return row
+
+def run(root, repeat, dense_sizes):
+    """Times segmentation only (page text is extracted once up front) on each collection and on dense pages."""
+    rows = []
+    for collection in sorted(glob.glob(os.path.join(root, "*", "PDFs"))):
+        pages = [lines for pdf_path in sorted(glob.glob(os.path.join(collection, "*.pdf")))
+                 for lines in page_lines(pdf_path)]
+        rows.append(compare(os.path.basename(os.path.dirname(collection)), pages, repeat))
+    for n in dense_sizes:
+        rows.append(compare(f"dense page ({n} sections)", [dense_page(n)], repeat))
+    return rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark section segmentation on the bundled collections")
+    parser.add_argument("--root", default=".", help="Folder containing the collection folders")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per PDF (best is kept)")
+    parser.add_argument("--dense", default="50,200,800", help="Section counts of synthetic dense pages")
+    parser.add_argument("--output", default=None, help="Write results to this JSON file")
+    args = parser.parse_args()
+    results = run(args.root, args.repeat, [int(n) for n in args.dense.split(",") if n])
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,126 @@
+import hashlib
+import json
+import os
+import numpy as np
+from model_loader import DEFAULT_MODEL_NAME, get_sentence_model, load_once
+
+BACKENDS = ("torch", "onnx")
+# Backend used when none is configured: "torch" (SentenceTransformer) or "onnx"
+DEFAULT_BACKEND = os.environ.get("EMBEDDING_BACKEND", "torch")
+# Folder written by export_onnx.py
+DEFAULT_ONNX_DIR = os.environ.get("EMBEDDING_ONNX_DIR", "onnx_model")
+
+_config = {"backend": DEFAULT_BACKEND, "model_name": DEFAULT_MODEL_NAME, "onnx_dir": DEFAULT_ONNX_DIR}
+
+class TorchBackend:
+    """Embeds text with the PyTorch SentenceTransformer model."""
+
+    def __init__(self, model_name=DEFAULT_MODEL_NAME):
+        self.model_name = model_name
+        self.model = get_sentence_model(model_name)
+
+    @property
+    def dimension(self):
+        return self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts, batch_size=64):
+        return np.asarray(self.model.encode(texts, batch_size=batch_size, convert_to_numpy=True),
+                          dtype=np.float32)
+
+def onnx_model_path(model_dir):
+    """The model file ``OnnxBackend`` loads from ``model_dir``: the int8 export if present."""
+    model_path = os.path.join(model_dir, "model_quantized.onnx")
+    if not os.path.exists(model_path):
+        model_path = os.path.join(model_dir, "model.onnx")
+    return model_path
+
+class OnnxBackend:
+    """
+    Embeds text with an ONNX export of the model under ONNX Runtime on CPU.
+
+    Reproduces the SentenceTransformer pipeline for MiniLM models: WordPiece
+    tokenization from ``tokenizer.json``, the transformer, attention-masked mean
+    pooling and L2 normalization. Prefers ``model_quantized.onnx`` (dynamic
+    int8) over ``model.onnx`` when both exist.
+    """
+
+    def __init__(self, model_dir=DEFAULT_ONNX_DIR, max_length=None, threads=None):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError("The onnx backend needs onnxruntime, which the default image does not "
+                              "install: pip install onnxruntime==1.16.3") from e
+        from tokenizers import Tokenizer
+
+        model_path = onnx_model_path(model_dir)
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        if max_length is None:
+            info_path = os.path.join(model_dir, "export_info.json")
+            max_length = 512
+            if os.path.exists(info_path):
+                with open(info_path, "r", encoding="utf-8") as f:
+                    max_length = json.load(f).get("max_seq_length") or max_length
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()
+        self.model_path = model_path
+
+    @property
+    def dimension(self):
+        return self.session.get_outputs()[0].shape[-1]
+
+    def encode(self, texts, batch_size=64):
+        out = []
+        for start in range(0, len(texts), batch_size):
+            encodings = self.tokenizer.encode_batch(texts[start:start + batch_size])
+            input_ids = np.asarray([e.ids for e in encodings], dtype=np.int64)
+            attention_mask = np.asarray([e.attention_mask for e in encodings], dtype=np.int64)
+            feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+            if "token_type_ids" in self.input_names:
+                feeds["token_type_ids"] = np.asarray([e.type_ids for e in encodings], dtype=np.int64)
+            hidden = self.session.run(None, feeds)[0]
+            mask = attention_mask[:, :, None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            out.append(pooled.astype(np.float32))
+        if not out:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        return np.concatenate(out)
+
+def configure_backend(backend=None, model_name=None, onnx_dir=None):
+    """Selects the backend returned by ``get_backend()``; arguments left as None are unchanged."""
+    if backend is not None and backend not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend: {backend!r}")
+    for key, value in (("backend", backend), ("model_name", model_name), ("onnx_dir", onnx_dir)):
+        if value is not None:
+            _config[key] = value
+
+def backend_id():
+    """
+    Identifies the vectors the configured backend produces, without loading it
+    (keys embedding caches and vector indexes). For ONNX this covers whether
+    the int8 or the float model is used and which export of it, so
+    re-exporting or switching ``onnx_dir`` never reuses stale vectors.
+    """
+    if _config["backend"] == "onnx":
+        model_path = os.path.abspath(onnx_model_path(_config["onnx_dir"]))
+        variant = "int8" if os.path.basename(model_path) == "model_quantized.onnx" else "fp32"
+        try:
+            st = os.stat(model_path)
+            source = f"{model_path}:{st.st_size}:{st.st_mtime_ns}"
+        except OSError:
+            source = model_path
+        source = hashlib.sha1(source.encode("utf-8")).hexdigest()[:12]
+        return f"{_config['model_name']}-onnx-{variant}-{source}"
+    return _config["model_name"]
+
+def get_backend():
+    """Returns the shared instance of the configured backend, loading it on first use."""
+    backend, model_name, onnx_dir = _config["backend"], _config["model_name"], _config["onnx_dir"]
+    if backend == "onnx":
+        return load_once(f"backend:onnx:{onnx_dir}", lambda: OnnxBackend(onnx_dir))
+    return load_once(f"backend:torch:{model_name}", lambda: TorchBackend(model_name))
@@ -0,0 +1,161 @@
+import atexit
+import fcntl
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+import numpy as np
+
+# Entries kept per model before least recently used ones are evicted
+DEFAULT_MAX_ENTRIES = 200_000
+# Calls where every text hits only record recency in memory; it is written at
+# most this often (and at exit) instead of rewriting the index on every call
+RECENCY_FLUSH_SECONDS = 60
+
+def normalize_text(text: str) -> str:
+    """Collapses whitespace so layout-only differences share one cache entry."""
+    return " ".join(text.split())
+
+def text_key(text: str) -> str:
+    return hashlib.sha1(normalize_text(text).encode("utf-8")).hexdigest()
+
+class EmbeddingCache:
+    """
+    Persistent embedding store for one model.
+
+    Vectors live in a raw float32 file that is memory-mapped for reads;
+    ``index.json`` maps text keys to rows plus a last-used time. Writers
+    serialize on an ``fcntl`` lock, append rows first and then atomically
+    replace the index, so readers never need the lock: any index they load only
+    points at rows that were already written. Compaction writes a new vectors
+    file under a fresh name, so readers holding the old mapping are unaffected.
+    """
+
+    def __init__(self, cache_dir: str, model_name: str, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.dir = os.path.join(cache_dir, re.sub(r"[^A-Za-z0-9._-]+", "_", model_name))
+        self.max_entries = max_entries
+        os.makedirs(self.dir, exist_ok=True)
+        self.index_path = os.path.join(self.dir, "index.json")
+        self.lock_path = os.path.join(self.dir, "lock")
+        self.touched = {}
+        self._flushed = time.time()
+        self._load()
+        atexit.register(self.flush)
+
+    def _load(self):
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                self.index = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self.index = {"dim": 0, "vectors": None, "rows": {}}
+        self.vectors = None
+        if self.index["vectors"] and self.index["rows"]:
+            path = os.path.join(self.dir, self.index["vectors"])
+            try:
+                self.vectors = np.memmap(path, dtype=np.float32, mode="r",
+                                         shape=(len(self.index["rows"]), self.index["dim"]))
+            except (FileNotFoundError, ValueError):
+                # Compacted away between reading the index and the vectors; start empty
+                self.index = {"dim": 0, "vectors": None, "rows": {}}
+
+    def lookup(self, texts: list):
+        """Returns ``(keys, found)`` where ``found`` maps positions in ``texts`` to cached vectors."""
+        keys = [text_key(t) for t in texts]
+        found = {}
+        rows = self.index["rows"]
+        now = time.time()
+        for i, key in enumerate(keys):
+            entry = rows.get(key)
+            if entry is not None:
+                found[i] = self.vectors[entry[0]]
+                self.touched[key] = now
+        return keys, found
+
+    def store(self, keys: list, vectors: np.ndarray):
+        """Adds vectors for new keys and persists recency of keys used since the last store."""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if not len(vectors) and not self.touched:
+            return
+        with open(self.lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            self._load()  # pick up rows other processes appended
+            rows = self.index["rows"]
+            if not rows:
+                if not len(vectors):
+                    return
+                self.index["dim"] = vectors.shape[1]
+                self.index["vectors"] = f"vectors-{int(time.time() * 1e6)}.f32"
+            now = time.time()
+            new_keys = []
+            new_rows = []
+            for key, vec in zip(keys, vectors):
+                if key not in rows and key not in new_keys:
+                    new_keys.append(key)
+                    new_rows.append(vec)
+            path = os.path.join(self.dir, self.index["vectors"])
+            if new_rows:
+                with open(path, "r+b" if os.path.exists(path) else "wb") as f:
+                    f.seek(len(rows) * self.index["dim"] * 4)
+                    f.write(np.asarray(new_rows, dtype=np.float32).tobytes())
+                    f.truncate()
+                    f.flush()
+                    os.fsync(f.fileno())
+                for key in new_keys:
+                    rows[key] = [len(rows), now]
+            for key, used in self.touched.items():
+                if key in rows:
+                    rows[key][1] = max(rows[key][1], used)
+            self.touched = {}
+            self._flushed = time.time()
+            if len(rows) > self.max_entries:
+                self._compact()
+            self._write_index()
+            self._load()
+
+    def flush(self):
+        """Persists recency of keys used since the last store."""
+        if self.touched:
+            self.store([], np.zeros((0, self.index["dim"]), dtype=np.float32))
+
+    def _compact(self):
+        """Keeps the most recently used 80% of ``max_entries`` in a new vectors file."""
+        rows = self.index["rows"]
+        dim = self.index["dim"]
+        old_path = os.path.join(self.dir, self.index["vectors"])
+        old = np.fromfile(old_path, dtype=np.float32).reshape(-1, dim)
+        keep = sorted(rows.items(), key=lambda kv: kv[1][1], reverse=True)[:int(self.max_entries * 0.8)]
+        new_name = f"vectors-{int(time.time() * 1e6)}.f32"
+        old[[entry[0] for _, entry in keep]].tofile(os.path.join(self.dir, new_name))
+        self.index["rows"] = {key: [i, entry[1]] for i, (key, entry) in enumerate(keep)}
+        self.index["vectors"] = new_name
+        self._stale = old_path
+
+    def _write_index(self):
+        fd, tmp_path = tempfile.mkstemp(dir=self.dir, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(self.index, f)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, self.index_path)
+        stale = getattr(self, "_stale", None)
+        if stale:
+            # Safe once the new index is visible; open mappings keep the old file alive
+            os.remove(stale)
+            self._stale = None
+
+    def get_many(self, texts: list, encode_fn) -> np.ndarray:
+        """Looks texts up first and calls ``encode_fn`` only for distinct misses."""
+        if not texts:
+            return np.zeros((0, self.index["dim"]), dtype=np.float32)
+        keys, found = self.lookup(texts)
+        missing = list(dict.fromkeys(texts[i] for i in range(len(texts)) if i not in found))
+        encoded = {}
+        if missing:
+            missing_emb = np.asarray(encode_fn(missing), dtype=np.float32)
+            encoded = dict(zip(missing, missing_emb))
+            self.store([text_key(t) for t in missing], missing_emb)
+        elif time.time() - self._flushed >= RECENCY_FLUSH_SECONDS:
+            self.flush()
+        return np.asarray([found[i] if i in found else encoded[texts[i]] for i in range(len(texts))],
+                          dtype=np.float32)
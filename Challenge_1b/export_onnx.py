@@ -0,0 +1,131 @@
+import argparse
+import glob
+import json
+import os
+import time
+import numpy as np
+
+from embedding_backend import OnnxBackend, TorchBackend
+from model_loader import DEFAULT_MODEL_NAME
+
+def export(model_name, output_dir, quantize=True, opset=14):
+    """
+    Exports the SentenceTransformer's transformer to ``output_dir/model.onnx``,
+    saves its tokenizer as ``tokenizer.json`` and, with ``quantize``, writes a
+    dynamic int8 ``model_quantized.onnx`` next to it.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    os.makedirs(output_dir, exist_ok=True)
+    st_model = SentenceTransformer(model_name, device="cpu")
+    transformer = st_model[0].auto_model.eval()
+    tokenizer = st_model.tokenizer
+    tokenizer.save_pretrained(output_dir)
+
+    class HiddenStates(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            return self.model(input_ids=input_ids, attention_mask=attention_mask,
+                              token_type_ids=token_type_ids).last_hidden_state
+
+    sample = tokenizer(["an example sentence", "another one"], padding=True, return_tensors="pt")
+    names = ["input_ids", "attention_mask", "token_type_ids"]
+    args = tuple(sample[name] for name in names)
+    model_path = os.path.join(output_dir, "model.onnx")
+    kwargs = dict(
+        input_names=names,
+        output_names=["last_hidden_state"],
+        dynamic_axes={**{name: {0: "batch", 1: "sequence"} for name in names},
+                      "last_hidden_state": {0: "batch", 1: "sequence"}},
+        opset_version=opset,
+    )
+    with torch.no_grad():
+        try:
+            torch.onnx.export(HiddenStates(transformer), args, model_path, dynamo=False, **kwargs)
+        except TypeError:  # torch < 2.5 has no dynamo switch
+            torch.onnx.export(HiddenStates(transformer), args, model_path, **kwargs)
+    with open(os.path.join(output_dir, "export_info.json"), "w", encoding="utf-8") as f:
+        json.dump({"model_name": model_name, "max_seq_length": st_model.max_seq_length,
+                   "quantized": quantize}, f, indent=2)
+    print(f"Exported {model_name} to {model_path} ({os.path.getsize(model_path) / 1e6:.1f} MB)")
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantized_path = os.path.join(output_dir, "model_quantized.onnx")
+        quantize_dynamic(model_path, quantized_path, weight_type=QuantType.QInt8)
+        print(f"Quantized to {quantized_path} ({os.path.getsize(quantized_path) / 1e6:.1f} MB)")
+
+def collection_inputs(root="."):
+    """Yields ``(name, query, section_titles)`` for every bundled collection under ``root``."""
+    from main import load_input
+    from pdf_parser import extract_sections_from_pdf
+    for input_json in sorted(glob.glob(os.path.join(root, "*", "challenge1b_input.json"))):
+        collection = os.path.dirname(input_json)
+        pdf_files, persona, job = load_input(input_json)
+        titles = []
+        for name in pdf_files:
+            pdf_path = os.path.join(collection, "PDFs", name)
+            if os.path.exists(pdf_path):
+                titles.extend(sec["section_title"] for sec in extract_sections_from_pdf(pdf_path))
+        yield os.path.basename(collection), f"{persona}. Task: {job}", titles
+
+def timed_encode(backend, texts, batch_size):
+    backend.encode(texts[:batch_size], batch_size)  # warm-up
+    start = time.perf_counter()
+    emb = backend.encode(texts, batch_size)
+    return emb, time.perf_counter() - start
+
+def check(model_name, onnx_dir, root=".", batch_size=64, top_k=12):
+    """
+    Compares the ONNX backend with the PyTorch one on the bundled collections:
+    per-title cosine agreement, overlap of the top-k titles by similarity to the
+    collection query, and encoding throughput of each backend.
+    """
+    reference = TorchBackend(model_name)
+    candidate = OnnxBackend(onnx_dir)
+    report = []
+    for name, query, titles in collection_inputs(root):
+        if not titles:
+            continue
+        ref_emb, ref_seconds = timed_encode(reference, titles, batch_size)
+        cand_emb, cand_seconds = timed_encode(candidate, titles, batch_size)
+        ref_emb /= np.linalg.norm(ref_emb, axis=1, keepdims=True)
+        agreement = np.sum(ref_emb * cand_emb, axis=1)
+        ref_top = set(np.argsort(-(ref_emb @ reference.encode([query])[0]))[:top_k])
+        cand_top = set(np.argsort(-(cand_emb @ candidate.encode([query])[0]))[:top_k])
+        row = {
+            "collection": name,
+            "titles": len(titles),
+            "mean_cosine": round(float(agreement.mean()), 5),
+            "min_cosine": round(float(agreement.min()), 5),
+            f"top{top_k}_overlap": round(len(ref_top & cand_top) / min(top_k, len(titles)), 3),
+            "torch_titles_per_second": round(len(titles) / ref_seconds, 1),
+            "onnx_titles_per_second": round(len(titles) / cand_seconds, 1),
+        }
+        report.append(row)
+        print(json.dumps(row))
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the embedding model to ONNX and check it against PyTorch")
+    parser.add_argument("--model", default=DEFAULT_MODEL_NAME, help="SentenceTransformer model name or path")
+    parser.add_argument("--output", default="onnx_model", help="Folder for the exported model")
+    parser.add_argument("--no-quantize", action="store_true", help="Skip dynamic int8 quantization")
+    parser.add_argument("--skip-export", action="store_true", help="Only run the check on an existing export")
+    parser.add_argument("--check", action="store_true",
+                        help="Compare accuracy and throughput with the PyTorch backend on the bundled collections")
+    parser.add_argument("--root", default=".", help="Folder containing the collection folders")
+    parser.add_argument("--report", default=None, help="Write the check results to this JSON file")
+    args = parser.parse_args()
+
+    if not args.skip_export:
+        export(args.model, args.output, quantize=not args.no_quantize)
+    if args.check:
+        results = check(args.model, args.output, args.root)
+        if args.report:
+            with open(args.report, "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=2)
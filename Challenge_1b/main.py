@@ -1,12 +1,44 @@
+import time
+_IMPORT_START = time.time()
 import os
 os.environ['TF_ENABLE_ONEDNN_OPTS'] = '0'
+import contextlib
 import glob
+import io
 import json
-import time
+import multiprocessing
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
-from pdf_parser import extract_sections_from_pdf
-from relevance import rank_sections_by_relevance
+import metrics
+from model_loader import prewarm, startup_report
+from pdf_parser import PARSER_VERSION, filter_sections, iter_parsed_pdfs
+from pipeline import rank_streaming
+from embedding_backend import BACKENDS, configure_backend
+from embedding_cache import DEFAULT_MAX_ENTRIES
+from relevance import configure_embedding_cache, rank_sections_by_relevance, score_queries
+from section_store import DEFAULT_MAX_BYTES as SECTION_STORE_MAX_BYTES, SectionStore
+from sharding import DEFAULT_LEASE_SECONDS, ShardQueue, run_worker
+from vector_index import DEFAULT_NPROBE, DEFAULT_SHORTLIST, INDEX_KINDS, VectorIndex
 from summarizer import summarize_text, create_generalized_summary
+# Heavy libraries (sentence-transformers, nltk) are loaded on first use by model_loader
+IMPORT_SECONDS = time.time() - _IMPORT_START
+
+# Processes used to parse PDFs (None = one per CPU core)
+PARSE_WORKERS = None
+# Collections processed concurrently by forked workers sharing the loaded model
+COLLECTION_WORKERS = 1
+# Shared directory for multi-node sharded batches (None = process every collection here)
+SHARD_DIR = None
+SHARD_LEASE_SECONDS = DEFAULT_LEASE_SECONDS
+RETRY_FAILED = False
+# Overlap parsing with embedding/ranking instead of running them as phases
+STREAMING = False
+# Parsed sections reused across runs, enabled by --section-store or SECTION_STORE_DIR
+SECTION_STORE = None
+# Persistent section index, enabled by --index; ranking then scores only a shortlist
+VECTOR_INDEX = None
+SHORTLIST = DEFAULT_SHORTLIST
 
 def load_input(input_file):
     with open(input_file, "r", encoding="utf-8") as f:
@@ -16,6 +48,28 @@ def load_input(input_file):
     pdf_files = [doc["filename"] for doc in data["documents"]]
     return pdf_files, persona, job_to_be_done
 
+def load_queries(input_file):
+    """
+    Like ``load_input``, but also accepts a ``queries`` list of
+    ``{"id", "persona": {"role"}, "job_to_be_done": {"task"}}`` objects, so one
+    document set can be ranked for many persona/job pairs. Returns
+    ``(pdf_files, queries)``; a single-query file gives one query whose id is None.
+    """
+    with open(input_file, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    pdf_files = [doc["filename"] for doc in data["documents"]]
+    if "queries" not in data:
+        return pdf_files, [{"id": None, "persona": data["persona"]["role"],
+                            "job_to_be_done": data["job_to_be_done"]["task"]}]
+    queries = []
+    for i, query in enumerate(data["queries"], 1):
+        queries.append({
+            "id": str(query.get("id") or f"query_{i}"),
+            "persona": query["persona"]["role"],
+            "job_to_be_done": query["job_to_be_done"]["task"]
+        })
+    return pdf_files, queries
+
 def detect_input_structure():
     """Detect whether we're using collections structure or input/output structure"""
     # Check for input/output structure first
@@ -98,22 +152,43 @@ def process_collections_structure():
     for i, collection in enumerate(collections, 1):
         print(f"  {i}. {collection}")
     
-    # Process each collection
-    successful = 0
-    failed = 0
-    
-    for collection in collections:
-        input_json = os.path.join(collection, "challenge1b_input.json")
-        if not os.path.exists(input_json):
-            input_json = os.path.join(collection, "input.json")
-        
-        pdfs_folder = os.path.join(collection, "PDFs")
-        output_dir = collection
-        
-        if process_single_input(input_json, pdfs_folder, output_dir, "collections"):
-            successful += 1
-        else:
-            failed += 1
+    # Largest collections first, so the longest runs start early and the pool drains evenly
+    collections.sort(key=collection_size, reverse=True)
+    if SHARD_DIR:
+        return process_sharded_collections(collections)
+    start_time = time.time()
+    results = []
+    workers = max(1, min(COLLECTION_WORKERS, len(collections)))
+    if workers > 1 and "fork" not in multiprocessing.get_all_start_methods():
+        print("Parallel collections need fork to share the loaded model; processing serially")
+        workers = 1
+    if workers == 1:
+        for collection in collections:
+            results.append(_run_collection(collection))
+    else:
+        # Load the model once and fork workers afterwards, so they share its memory
+        print(f"Processing collections on {workers} worker processes...")
+        prewarm()
+        parse_workers = PARSE_WORKERS or max(1, (os.cpu_count() or 1) // workers)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork"),
+                                 initializer=_init_collection_worker, initargs=(parse_workers,)) as pool:
+            futures = {pool.submit(_measured, _run_collection, collection, True): collection
+                       for collection in collections}
+            for future in as_completed(futures):
+                try:
+                    result, worker_metrics = future.result()
+                except Exception as e:
+                    # e.g. the worker process died; the other collections still complete
+                    print(f"ERROR processing {futures[future]}: {e}")
+                    results.append((futures[future], False, 0.0, ""))
+                    continue
+                metrics.merge(worker_metrics)
+                # Logs are captured per collection and printed whole, so they don't interleave
+                print(result[3], end="")
+                results.append(result)
+    wall_time = time.time() - start_time
+    successful = sum(1 for _, ok, _, _ in results if ok)
+    failed = len(results) - successful
     
     print(f"\n{'='*60}")
     print(f"BATCH PROCESSING COMPLETE")
@@ -121,12 +196,166 @@ def process_collections_structure():
     print(f"Successful: {successful}")
     print(f"Failed: {failed}")
     print(f"Total: {len(collections)}")
+    print(f"Per-collection timings:")
+    for collection, ok, seconds, _ in sorted(results, key=lambda r: collections.index(r[0])):
+        print(f"  {collection}: {seconds:.2f} seconds ({collection_size(collection) / 1e6:.1f} MB, "
+              f"{'ok' if ok else 'FAILED'})")
+    print(f"Wall time: {wall_time:.2f} seconds (sum of collections: {sum(r[2] for r in results):.2f} seconds)")
     print(f"{'='*60}")
     
     return successful > 0
 
+def process_sharded_collections(collections):
+    """
+    Claim collections from a manifest in ``SHARD_DIR`` shared with other
+    workers (possibly on other machines), process them until the manifest is
+    finished, and print the merged report.
+    """
+    shard_queue = ShardQueue(SHARD_DIR, collections, SHARD_LEASE_SECONDS)
+    if RETRY_FAILED:
+        shard_queue.reset_failed()
+    print(f"Shard directory: {SHARD_DIR} ({len(shard_queue.items)} collections in manifest, "
+          f"{shard_queue.pending()} pending)")
+    workers = max(1, COLLECTION_WORKERS)
+    worker_errors = 0
+    if workers > 1 and "fork" in multiprocessing.get_all_start_methods():
+        # Each forked process is an independent shard worker sharing the loaded model
+        prewarm()
+        parse_workers = PARSE_WORKERS or max(1, (os.cpu_count() or 1) // workers)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork"),
+                                 initializer=_init_collection_worker, initargs=(parse_workers,)) as pool:
+            for future in [pool.submit(_measured, _run_shard_worker, True) for _ in range(workers)]:
+                try:
+                    metrics.merge(future.result()[1])
+                except Exception as e:
+                    # Its leased collection is reclaimed by a later run once the lease expires
+                    print(f"ERROR in shard worker: {e}")
+                    worker_errors += 1
+    else:
+        _run_shard_worker()
+    report = shard_queue.write_report()
+    
+    print(f"\n{'='*60}")
+    print(f"SHARDED BATCH PROGRESS")
+    print(f"{'='*60}")
+    print(f"Done: {report['done']}/{report['total']} (failed: {report['failed']}, "
+          f"in progress elsewhere: {report['in_progress']})")
+    if worker_errors:
+        print(f"Shard workers that died: {worker_errors}")
+    for worker, counts in sorted(report["workers"].items()):
+        print(f"  {worker}: {counts['done']} done, {counts['failed']} failed, {counts['seconds']:.2f} seconds")
+    if report.get("items_per_minute"):
+        print(f"Throughput: {report['items_per_minute']:.2f} collections/minute")
+    print(f"Report written to {os.path.join(SHARD_DIR, 'report.json')}")
+    print(f"{'='*60}")
+    return report["failed"] == 0 and not worker_errors
+
+def _run_shard_worker(capture=False):
+    def process(collection):
+        _, ok, _, log = _run_collection(collection, capture)
+        print(log, end="")
+        return ok
+    return run_worker(ShardQueue(SHARD_DIR, lease_seconds=SHARD_LEASE_SECONDS), process)
+
+def collection_size(collection):
+    """Total bytes of a collection's PDFs, used to schedule the largest collections first."""
+    pdfs_folder = os.path.join(collection, "PDFs")
+    return sum(e.stat().st_size for e in os.scandir(pdfs_folder) if e.is_file())
+
+def _init_collection_worker(parse_workers):
+    """Split the CPUs between collection workers for PDF parsing."""
+    global PARSE_WORKERS
+    PARSE_WORKERS = parse_workers
+    metrics.reset()
+
+def _measured(fn, *args):
+    """Run ``fn`` in a worker process and return its result with the worker's metrics."""
+    return fn(*args), metrics.snapshot()
+
+def _run_collection(collection, capture=False):
+    """Process one collection folder; returns ``(collection, ok, seconds, captured_log)``."""
+    input_json = os.path.join(collection, "challenge1b_input.json")
+    if not os.path.exists(input_json):
+        input_json = os.path.join(collection, "input.json")
+    
+    pdfs_folder = os.path.join(collection, "PDFs")
+    output_dir = collection
+    
+    start = time.time()
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log) if capture else contextlib.nullcontext():
+        try:
+            ok = process_single_input(input_json, pdfs_folder, output_dir, "collections")
+        except Exception as e:
+            print(f"ERROR processing {collection}: {e}")
+            ok = False
+    return collection, ok, time.time() - start, log.getvalue()
+
+def output_path(output_dir, structure_type, query_id=None):
+    """Output file for a run; batch queries get one file each, suffixed with the query id."""
+    base = "output" if structure_type == "input_output" else "challenge1b_output"
+    if query_id is not None:
+        base += "_" + re.sub(r"[^A-Za-z0-9._-]+", "_", query_id)
+    return os.path.join(output_dir, base + ".json")
+
+@metrics.timed("summarize")
+def summarize_sections(ranked_sections, persona, job_to_be_done):
+    """Step 4: ``(extracted_sections, subsection_analysis, semantic_summary)`` for ranked sections."""
+    # Create a comprehensive generalized summary
+    semantic_summary = create_generalized_summary(ranked_sections, persona, job_to_be_done)
+    
+    highlights = []
+    refined = []
+    
+    for rank, sec in enumerate(ranked_sections, 1):
+        highlights.append({
+            "document": sec["document"],
+            "section_title": sec["section_title"],
+            "importance_rank": rank,
+            "page_number": sec["page_number"]
+        })
+        
+        # Generate individual section summary
+        section_text = sec.get("text", "")
+        if section_text and len(section_text.strip()) > 50:
+            summary = summarize_text(section_text, min_sentences=1, max_sentences=3)
+            if not summary:
+                # Fallback: extract first few meaningful sentences
+                sentences = [s.strip() for s in section_text.split('.') if len(s.strip()) > 30]
+                summary = ". ".join(sentences[:2]) if sentences else ""
+        else:
+            summary = ""
+        
+        refined.append({
+            "document": sec["document"],
+            "refined_text": summary,
+            "page_number": sec["page_number"]
+        })
+    return highlights, refined, semantic_summary
+
+def build_output(collection_name, pdf_files, persona, job_to_be_done, summaries, structure_type, query_id=None):
+    """The ``challenge1b_output.json`` document for one query, from what ``summarize_sections`` returned."""
+    highlights, refined, semantic_summary = summaries
+    metadata = {
+        "collection": collection_name,
+        "input_documents": [os.path.basename(f) for f in pdf_files],
+        "persona": persona,
+        "job_to_be_done": job_to_be_done,
+        "processing_timestamp": datetime.now().isoformat(),
+        "structure_type": structure_type
+    }
+    if query_id is not None:
+        metadata["query_id"] = query_id
+    return {
+        "metadata": metadata,
+        "extracted_sections": highlights,
+        "subsection_analysis": refined,
+        "semantic_summary": semantic_summary
+    }
+
+@metrics.timed("collection")
 def process_single_input(input_json, pdfs_folder, output_dir, structure_type):
-    """Process a single input configuration"""
+    """Process a single input configuration (one or many persona/job queries)"""
     collection_name = os.path.basename(output_dir) if structure_type == "collections" else "input_output"
     
     print(f"\n{'='*60}")
@@ -138,20 +367,14 @@ def process_single_input(input_json, pdfs_folder, output_dir, structure_type):
     # 1. Load input data
     step_start = time.time()
     try:
-        pdf_files, persona, job_to_be_done = load_input(input_json)
+        pdf_files, queries = load_queries(input_json)
         # Prepend the PDFs folder path to each filename
         pdf_files = [os.path.join(pdfs_folder, f) for f in pdf_files]
-        
-        metadata = {
-            "collection": collection_name,
-            "input_documents": [os.path.basename(f) for f in pdf_files],
-            "persona": persona,
-            "job_to_be_done": job_to_be_done,
-            "processing_timestamp": datetime.now().isoformat(),
-            "structure_type": structure_type
-        }
+        batch = queries[0]["id"] is not None
+        metrics.count("queries", len(queries))
         step_time = time.time() - step_start
-        print(f"Step 1 - Input loading: {step_time:.2f} seconds")
+        print(f"Step 1 - Input loading: {step_time:.2f} seconds"
+              + (f" ({len(queries)} queries)" if batch else ""))
     except Exception as e:
         print(f"ERROR loading input file: {e}")
         return False
@@ -159,111 +382,132 @@ def process_single_input(input_json, pdfs_folder, output_dir, structure_type):
     # 2. Extract sections from all PDFs
     step_start = time.time()
     all_sections = []
-    for i, pdf_file in enumerate(pdf_files, 1):
-        if not os.path.exists(pdf_file):
+    existing_files = []
+    for pdf_file in pdf_files:
+        if os.path.exists(pdf_file):
+            existing_files.append(pdf_file)
+        else:
             print(f"WARNING: PDF file not found: {pdf_file}")
-            continue
-            
-        print(f"Processing PDF {i}/{len(pdf_files)}: {os.path.basename(pdf_file)}")
+    
+    if STREAMING and not batch:
+        # 2+3. Parse, embed and rank as one overlapped pipeline
+        query = queries[0]
+        print("Parsing and ranking sections as a streaming pipeline...")
         try:
-            sections = extract_sections_from_pdf(pdf_file)
-            for sec in sections:
-                sec["document"] = os.path.basename(pdf_file)
-                # Filter out sections with very little content
-                if len(sec.get("text", "").strip()) > 50:
-                    all_sections.append(sec)
+            ranked_sections, stats = rank_streaming(existing_files, query["persona"], query["job_to_be_done"],
+                                                    top_n=12, workers=PARSE_WORKERS, store=SECTION_STORE)
         except Exception as e:
-            print(f"ERROR processing {pdf_file}: {e}")
-            continue
-            
-    step_time = time.time() - step_start
-    print(f"Step 2 - PDF extraction: {step_time:.2f} seconds ({len(all_sections)} sections extracted)")
-
-    # 3. Rank sections by relevance
-    step_start = time.time()
-    print("Ranking sections by relevance...")
-    try:
-        ranked_sections = rank_sections_by_relevance(
-            all_sections, persona, job_to_be_done, top_n=12
-        )
+            print(f"ERROR in streaming pipeline: {e}")
+            return False
+        rankings = [ranked_sections]
         step_time = time.time() - step_start
-        print(f"Step 3 - Relevance ranking: {step_time:.2f} seconds")
-    except Exception as e:
-        print(f"ERROR in relevance ranking: {e}")
-        return False
-
-    # 4. Create generalized summary and individual summaries
-    step_start = time.time()
-    print("Generating summaries...")
-    
-    try:
-        # Create a comprehensive generalized summary
-        semantic_summary = create_generalized_summary(ranked_sections, persona, job_to_be_done)
-        
-        highlights = []
-        refined = []
-        
-        for rank, sec in enumerate(ranked_sections, 1):
-            highlights.append({
-                "document": sec["document"],
-                "section_title": sec["section_title"],
-                "importance_rank": rank,
-                "page_number": sec["page_number"]
-            })
-            
-            # Generate individual section summary
-            section_text = sec.get("text", "")
-            if section_text and len(section_text.strip()) > 50:
-                summary = summarize_text(section_text, min_sentences=1, max_sentences=3)
-                if not summary:
-                    # Fallback: extract first few meaningful sentences
-                    sentences = [s.strip() for s in section_text.split('.') if len(s.strip()) > 30]
-                    summary = ". ".join(sentences[:2]) if sentences else ""
-            else:
-                summary = ""
-            
-            refined.append({
-                "document": sec["document"],
-                "refined_text": summary,
-                "page_number": sec["page_number"]
-            })
-        
+        print(f"Step 2+3 - Streaming extraction and ranking: {step_time:.2f} seconds "
+              f"({stats['sections']} sections from {stats['documents']} documents, "
+              f"{stats['embed_seconds']:.2f} seconds embedding and scoring)")
+    elif VECTOR_INDEX is not None:
+        # 2. Index new or changed PDFs; unchanged ones are already in the index
+        try:
+            added = VECTOR_INDEX.update(existing_files, PARSE_WORKERS, SECTION_STORE)
+        except Exception as e:
+            print(f"ERROR updating vector index: {e}")
+            return False
         step_time = time.time() - step_start
-        print(f"Step 4 - Text summarization: {step_time:.2f} seconds")
-    except Exception as e:
-        print(f"ERROR in summarization: {e}")
-        return False
+        print(f"Step 2 - Index update: {step_time:.2f} seconds ({added} documents indexed, "
+              f"{len(VECTOR_INDEX)} sections in {VECTOR_INDEX.meta['kind']} index)")
 
-    # 5. Output JSON
-    step_start = time.time()
-    output = {
-        "metadata": metadata,
-        "extracted_sections": highlights,
-        "subsection_analysis": refined,
-        "semantic_summary": semantic_summary
-    }
-    
-    # Determine output filename based on structure type
-    if structure_type == "input_output":
-        output_json = os.path.join(output_dir, "output.json")
+        # 3. Rank a shortlist of the most similar sections from the index
+        step_start = time.time()
+        print("Ranking sections by relevance...")
+        try:
+            rankings = [
+                VECTOR_INDEX.rank(q["persona"], q["job_to_be_done"], top_n=12, shortlist=SHORTLIST,
+                                  pdf_files=existing_files)
+                for q in queries
+            ]
+            step_time = time.time() - step_start
+            print(f"Step 3 - Relevance ranking: {step_time:.2f} seconds")
+        except Exception as e:
+            print(f"ERROR in relevance ranking: {e}")
+            return False
     else:
-        output_json = os.path.join(output_dir, "challenge1b_output.json")
+        parsed = iter_parsed_pdfs(existing_files, PARSE_WORKERS, SECTION_STORE)
+        for i, (pdf_file, sections, seconds, error) in enumerate(parsed, 1):
+            if error is not None:
+                print(f"ERROR processing {pdf_file}: {error}")
+                continue
+            source = "loaded from store" if hasattr(sections, "select") else "parsed"
+            print(f"Processed PDF {i}/{len(existing_files)}: {os.path.basename(pdf_file)} "
+                  f"({source} in {seconds:.2f} seconds, {len(sections)} sections)")
+            # Filter out sections with very little content
+            for sec in filter_sections(sections, 50):
+                sec["document"] = os.path.basename(pdf_file)
+                all_sections.append(sec)
     
-    try:
-        with open(output_json, "w", encoding="utf-8") as f:
-            json.dump(output, f, indent=2, ensure_ascii=False)
         step_time = time.time() - step_start
-        print(f"Step 5 - Output generation: {step_time:.2f} seconds")
-    except Exception as e:
-        print(f"ERROR writing output.json: {e}")
-        return False
+        print(f"Step 2 - PDF extraction: {step_time:.2f} seconds ({len(all_sections)} sections extracted)")
+
+        # 3. Rank sections by relevance
+        step_start = time.time()
+        print("Ranking sections by relevance...")
+        try:
+            if batch:
+                # Titles encoded once, all queries in one batch, one query-by-section similarity matrix
+                results = score_queries(all_sections, [(q["persona"], q["job_to_be_done"]) for q in queries],
+                                        top_n=12)
+                rankings = [result["sections"] for result in results]
+            else:
+                rankings = [rank_sections_by_relevance(
+                    all_sections, queries[0]["persona"], queries[0]["job_to_be_done"], top_n=12
+                )]
+            step_time = time.time() - step_start
+            print(f"Step 3 - Relevance ranking: {step_time:.2f} seconds")
+        except Exception as e:
+            print(f"ERROR in relevance ranking: {e}")
+            return False
+
+    for query, ranked_sections in zip(queries, rankings):
+        persona = query["persona"]
+        job_to_be_done = query["job_to_be_done"]
+        if batch:
+            print(f"\nQuery {query['id']}: {persona}")
+
+        # 4. Create generalized summary and individual summaries
+        step_start = time.time()
+        print("Generating summaries...")
+        
+        try:
+            summaries = summarize_sections(ranked_sections, persona, job_to_be_done)
+            step_time = time.time() - step_start
+            print(f"Step 4 - Text summarization: {step_time:.2f} seconds")
+        except Exception as e:
+            print(f"ERROR in summarization: {e}")
+            return False
+
+        # 5. Output JSON
+        step_start = time.time()
+        output = build_output(collection_name, pdf_files, persona, job_to_be_done, summaries, structure_type,
+                              query["id"])
+        
+        output_json = output_path(output_dir, structure_type, query["id"])
+        
+        try:
+            with metrics.span("write_output"), open(output_json, "w", encoding="utf-8") as f:
+                json.dump(output, f, indent=2, ensure_ascii=False)
+            step_time = time.time() - step_start
+            print(f"Step 5 - Output generation: {step_time:.2f} seconds")
+        except Exception as e:
+            print(f"ERROR writing output.json: {e}")
+            return False
     
     # Calculate total execution time
     total_time = time.time() - start_time
     print(f"\n{'='*50}")
     print(f"Processing '{collection_name}' completed!")
     print(f"Total execution time: {total_time:.2f} seconds ({total_time/60:.2f} minutes)")
-    print(f"Output written to {output_json}")
+    if batch:
+        print(f"{len(queries)} outputs written to {output_dir}")
+    else:
+        print(f"Output written to {output_json}")
     print(f"{'='*50}")
     
     return True
@@ -290,8 +534,71 @@ if __name__ == "__main__":
     parser.add_argument("--all", action="store_true", help="Process all collection folders")
     parser.add_argument("--input-output", action="store_true", help="Force input/output folder structure")
     parser.add_argument("--collections", action="store_true", help="Force collections folder structure")
+    parser.add_argument("--streaming", action="store_true",
+                        help="Overlap PDF parsing with embedding and ranking")
+    parser.add_argument("--collection-workers", type=int, default=1,
+                        help="Collections processed concurrently, largest first (workers share the loaded model)")
+    parser.add_argument("--shard-dir", type=str,
+                        help="Share collections with workers on other machines through this directory")
+    parser.add_argument("--lease-seconds", type=int, default=DEFAULT_LEASE_SECONDS,
+                        help="Reclaim collections whose worker has not renewed its lease for this long")
+    parser.add_argument("--retry-failed", action="store_true", help="Retry collections that failed in the shard")
+    parser.add_argument("--parse-workers", type=int, default=None,
+                        help="Processes used to parse PDFs in parallel (default: CPU count)")
+    parser.add_argument("--section-store", type=str,
+                        help="Reuse parsed sections of unchanged PDFs from this folder (default: $SECTION_STORE_DIR)")
+    parser.add_argument("--section-store-mb", type=int, default=SECTION_STORE_MAX_BYTES // (1024 * 1024),
+                        help="Evict least recently used stored documents beyond this size")
+    parser.add_argument("--index", type=str,
+                        help="Keep section embeddings in a persistent vector index in this folder")
+    parser.add_argument("--index-kind", choices=INDEX_KINDS, default="auto",
+                        help="Exact flat search, approximate IVF search, or IVF only for large corpora")
+    parser.add_argument("--nprobe", type=int, default=DEFAULT_NPROBE, help="Inverted lists searched per query (IVF)")
+    parser.add_argument("--shortlist", type=int, default=DEFAULT_SHORTLIST,
+                        help="Candidates pulled from the index before keyword/constraint/quality scoring")
+    parser.add_argument("--backend", choices=BACKENDS, help="Embedding backend (default: $EMBEDDING_BACKEND or torch)")
+    parser.add_argument("--onnx-dir", type=str, help="Folder with the exported ONNX model (see export_onnx.py)")
+    parser.add_argument("--embedding-cache", type=str, help="Folder for the persistent embedding cache")
+    parser.add_argument("--embedding-cache-size", type=int, default=DEFAULT_MAX_ENTRIES,
+                        help="Maximum cached embeddings before least recently used ones are evicted")
+    parser.add_argument("--prewarm", action="store_true",
+                        help="Load the embedding model and NLTK data before processing")
+    parser.add_argument("--metrics", type=str,
+                        help="Write per-stage timings, counters and peak memory to this JSON file")
+    parser.add_argument("--profile", action="store_true",
+                        help="With --metrics, also run cProfile and save its stats next to the metrics file")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="With --metrics, also track peak Python allocations with tracemalloc (slower)")
+    parser.add_argument("--startup-report", action="store_true",
+                        help="Print import and model loading times at exit")
     args = parser.parse_args()
     
+    if args.startup_report:
+        import atexit
+        atexit.register(startup_report, IMPORT_SECONDS)
+    
+    if args.metrics:
+        metrics.enable(profile=args.profile, trace_memory=args.trace_memory)
+    PARSE_WORKERS = args.parse_workers
+    COLLECTION_WORKERS = args.collection_workers
+    SHARD_DIR = args.shard_dir
+    SHARD_LEASE_SECONDS = args.lease_seconds
+    RETRY_FAILED = args.retry_failed
+    STREAMING = args.streaming
+    section_store_dir = args.section_store or os.environ.get("SECTION_STORE_DIR", "")
+    if section_store_dir:
+        SECTION_STORE = SectionStore(section_store_dir, PARSER_VERSION, args.section_store_mb * 1024 * 1024)
+    configure_backend(args.backend, onnx_dir=args.onnx_dir)
+    # (Re)create the cache after the backend is chosen, since it is keyed by backend
+    if args.embedding_cache or args.backend:
+        configure_embedding_cache(args.embedding_cache or os.environ.get("EMBEDDING_CACHE_DIR", ""),
+                                  args.embedding_cache_size)
+    if args.index:
+        VECTOR_INDEX = VectorIndex(args.index, args.index_kind, args.nprobe)
+        SHORTLIST = args.shortlist
+    if args.prewarm:
+        prewarm()
+    
     # Determine which structure to use
     if args.input_output:
         structure = "input_output"
@@ -324,4 +631,8 @@ if __name__ == "__main__":
         process_input_output_structure()
     else:
         # Process collections structure
-        process_collections_structure() 
\ No newline at end of file
+        process_collections_structure()
+    
+    if args.metrics:
+        metrics.write(args.metrics, {"pipeline": "challenge_1b", "structure": structure})
+        print(f"Metrics written to {args.metrics}")
@@ -0,0 +1,227 @@
+import contextlib
+import functools
+import json
+import os
+import resource
+import tempfile
+import threading
+import time
+
+# Collection is off unless enable() is called; span() and count() are then no-ops
+ENABLED = False
+
+_NULL_SPAN = contextlib.nullcontext()
+_lock = threading.Lock()
+_local = threading.local()
+_spans = {}
+_counters = {}
+_started = None
+_profiler = None
+_trace_memory = False
+
+def enable(profile=False, trace_memory=False):
+    """
+    Start recording spans and counters. ``profile`` also runs cProfile over the
+    whole run; ``trace_memory`` tracks the peak of Python allocations with
+    tracemalloc (slower) on top of the always-recorded RSS figures.
+    """
+    global ENABLED, _started, _profiler, _trace_memory
+    ENABLED = True
+    _started = time.time()
+    if trace_memory:
+        import tracemalloc
+        tracemalloc.start()
+        _trace_memory = True
+    if profile:
+        import cProfile
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+
+_PAGE_KB = os.sysconf("SC_PAGE_SIZE") // 1024 if hasattr(os, "sysconf") else 4
+
+def _peak_rss_kb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def _current_rss_kb():
+    # Resident pages are the second field of /proc/self/statm; 0 where it does not exist
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * _PAGE_KB
+    except (OSError, IndexError, ValueError):
+        return 0
+
+def _new_entry():
+    return {"count": 0, "seconds": 0.0, "max_seconds": 0.0, "rss_delta_kb": 0, "max_rss_delta_kb": 0}
+
+class _Span:
+    """
+    Times a stage and records how much resident memory grew across it. RSS
+    is process-wide, so spans running concurrently on other threads are
+    included in each other's deltas.
+    """
+
+    __slots__ = ("name", "path", "start", "rss_kb")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        self.path = f"{stack[-1]}/{self.name}" if stack else self.name
+        stack.append(self.path)
+        self.rss_kb = _current_rss_kb()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.start
+        rss_delta = _current_rss_kb() - self.rss_kb
+        _local.stack.pop()
+        with _lock:
+            entry = _spans.get(self.path)
+            if entry is None:
+                entry = _spans[self.path] = _new_entry()
+            entry["count"] += 1
+            entry["seconds"] += seconds
+            entry["max_seconds"] = max(entry["max_seconds"], seconds)
+            entry["rss_delta_kb"] += rss_delta
+            entry["max_rss_delta_kb"] = max(entry["max_rss_delta_kb"], rss_delta)
+        return False
+
+def reset():
+    """Clear everything recorded; call at the start of a forked worker process."""
+    global _profiler
+    with _lock:
+        _spans.clear()
+        _counters.clear()
+    _local.stack = []
+    if _profiler is not None:
+        # Only the parent process writes profile output
+        _profiler.disable()
+        _profiler = None
+
+def timed(name):
+    """Decorator form of ``span``."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return fn(*args, **kwargs)
+            with _Span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def span(name):
+    """Context manager timing a stage; nested spans are recorded as ``parent/child`` paths."""
+    if not ENABLED:
+        return _NULL_SPAN
+    return _Span(name)
+
+def current():
+    """Path of the innermost open span on this thread, or None."""
+    stack = getattr(_local, "stack", None)
+    return stack[-1] if stack else None
+
+@contextlib.contextmanager
+def within(path):
+    """
+    Nest this thread's spans and merges under ``path`` (from ``current`` on
+    another thread) without timing anything, for work handed to a helper thread.
+    """
+    if not ENABLED or path is None:
+        yield
+        return
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    stack.append(path)
+    try:
+        yield
+    finally:
+        stack.pop()
+
+def count(name, n=1):
+    """Add ``n`` to a named counter."""
+    if not ENABLED:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+def snapshot(clear=True):
+    """Spans and counters recorded so far, e.g. to send from a worker process to ``merge``."""
+    if not ENABLED:
+        return None
+    with _lock:
+        data = {"spans": {path: dict(entry) for path, entry in _spans.items()}, "counters": dict(_counters)}
+        if clear:
+            _spans.clear()
+            _counters.clear()
+    return data
+
+def merge(data, prefix=None):
+    """Fold a worker's ``snapshot`` in, nesting its spans under ``prefix`` (default: the current span)."""
+    if not ENABLED or not data:
+        return
+    stack = getattr(_local, "stack", None)
+    if prefix is None and stack:
+        prefix = stack[-1]
+    with _lock:
+        for path, other in data["spans"].items():
+            path = f"{prefix}/{path}" if prefix else path
+            entry = _spans.get(path)
+            if entry is None:
+                entry = _spans[path] = _new_entry()
+            entry["count"] += other["count"]
+            entry["seconds"] += other["seconds"]
+            entry["max_seconds"] = max(entry["max_seconds"], other["max_seconds"])
+            entry["rss_delta_kb"] += other["rss_delta_kb"]
+            entry["max_rss_delta_kb"] = max(entry["max_rss_delta_kb"], other["max_rss_delta_kb"])
+        for name, n in data["counters"].items():
+            _counters[name] = _counters.get(name, 0) + n
+
+def write(path, extra=None, top=30):
+    """
+    Write everything recorded to ``path`` as JSON (via temp file + rename).
+    With profiling on, the raw cProfile stats go to ``<path>.prof`` and the
+    ``top`` functions by cumulative time are included in the JSON.
+    """
+    if not ENABLED:
+        return None
+    report = {
+        "pid": os.getpid(),
+        "wall_seconds": time.time() - _started,
+        "spans": dict(sorted(snapshot(clear=False)["spans"].items())),
+        "counters": dict(sorted(_counters.items())),
+        "memory": {"peak_rss_kb": _peak_rss_kb(), "rss_kb": _current_rss_kb()},
+        **(extra or {})
+    }
+    if _trace_memory:
+        import tracemalloc
+        current, peak = tracemalloc.get_traced_memory()
+        report["memory"].update({"traced_current_bytes": current, "traced_peak_bytes": peak})
+    if _profiler is not None:
+        import pstats
+        _profiler.disable()
+        _profiler.dump_stats(path + ".prof")
+        stats = pstats.Stats(_profiler)
+        ranked = sorted(stats.stats.items(), key=lambda kv: kv[1][3], reverse=True)[:top]
+        report["profile"] = {
+            "stats_file": path + ".prof",
+            "top_cumulative": [
+                {"function": f"{file}:{line}({func})", "calls": nc, "total_seconds": tt, "cumulative_seconds": ct}
+                for (file, line, func), (_, nc, tt, ct, _) in ranked
+            ]
+        }
+        _profiler.enable()
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    os.chmod(tmp_path, 0o644)
+    os.replace(tmp_path, path)
+    return report
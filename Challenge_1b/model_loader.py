@@ -0,0 +1,53 @@
+import threading
+import time
+
+# Default sentence embedding model for relevance ranking
+DEFAULT_MODEL_NAME = 'multi-qa-MiniLM-L6-cos-v1'
+
+_lock = threading.RLock()
+_loaded = {}
+_timings = []
+
+def load_once(name, factory):
+    """Builds a resource on first use, records how long it took, and reuses it afterwards."""
+    with _lock:
+        if name not in _loaded:
+            start = time.time()
+            _loaded[name] = factory()
+            _timings.append((name, time.time() - start))
+        return _loaded[name]
+
+def get_sentence_model(model_name=DEFAULT_MODEL_NAME):
+    """Returns the shared SentenceTransformer, importing and loading it on first call."""
+    def load():
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(model_name)
+    return load_once(f"sentence_model:{model_name}", load)
+
+def get_nltk():
+    """Returns the nltk module with the punkt tokenizer data fetched if missing."""
+    def load():
+        import nltk
+        try:
+            nltk.data.find('tokenizers/punkt')
+        except LookupError:
+            nltk.download('punkt')
+        return nltk
+    return load_once("nltk", load)
+
+def prewarm():
+    """Loads everything the pipeline needs up front (e.g. before serving or forking workers)."""
+    from embedding_backend import get_backend
+    get_backend()
+    get_nltk()
+
+def startup_report(import_seconds=None):
+    """Prints how long imports and each lazily loaded resource took."""
+    print("Startup time report:")
+    if import_seconds is not None:
+        print(f"  module imports: {import_seconds:.2f} seconds")
+    with _lock:
+        for name, seconds in _timings:
+            print(f"  {name}: {seconds:.2f} seconds")
+        if not _timings:
+            print("  (no models loaded)")
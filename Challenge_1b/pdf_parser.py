@@ -1,13 +1,39 @@
 import fitz  # PyMuPDF
+import metrics
+import os
 import re
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from keyword_matcher import KeywordMatcher
+
+# Bump whenever segmentation output changes, so stored sections are re-parsed
+PARSER_VERSION = 3
+
+# Common food-related words that indicate a dish name
+FOOD_INDICATORS = KeywordMatcher([
+    'salad', 'soup', 'pasta', 'rice', 'bread', 'cake', 'pie', 'stew', 'curry',
+    'lasagna', 'pizza', 'burger', 'sandwich', 'wrap', 'roll', 'dip', 'sauce',
+    'dressing', 'marinade', 'rub', 'spread', 'hummus', 'falafel', 'ratatouille',
+    'quiche', 'frittata', 'omelette', 'pancake', 'waffle', 'muffin', 'cookie',
+    'brownie', 'pudding', 'ice cream', 'sorbet', 'smoothie', 'juice', 'tea',
+    'coffee', 'cocktail', 'wine', 'beer', 'cheese', 'yogurt', 'granola'
+])
+PROPER_NOUN = re.compile(r'^[A-Z][a-z]+(?:\s+[A-Z][a-z]+)*$')
+DESCRIPTIVE_FOOD_NAME = re.compile(r'^[A-Z][a-z]+\s+(?:and\s+)?[A-Z][a-z]+(?:\s+[A-Z][a-z]+)*$')
+
+TITLE_PREFIX = re.compile(r'^(Recipe|Dish|Food|Meal|Course|Section|Chapter)\s*[:\-]?\s*', re.IGNORECASE)
+TITLE_SUFFIX = re.compile(r'[:\-]\s*$')
+NUMBER_PREFIX = re.compile(r'^\d+\.\s*')
+OUTER_SPACE = re.compile(r'^\s+|\s+$')
 
 def clean_title(title):
     """Clean and normalize a section title."""
     # Remove common prefixes and suffixes
-    title = re.sub(r'^(Recipe|Dish|Food|Meal|Course|Section|Chapter)\s*[:\-]?\s*', '', title, flags=re.IGNORECASE)
-    title = re.sub(r'[:\-]\s*$', '', title)
-    title = re.sub(r'^\d+\.\s*', '', title)  # Remove numbered prefixes
-    title = re.sub(r'^\s+|\s+$', '', title)  # Trim whitespace
+    title = TITLE_PREFIX.sub('', title)
+    title = TITLE_SUFFIX.sub('', title)
+    title = NUMBER_PREFIX.sub('', title)  # Remove numbered prefixes
+    title = OUTER_SPACE.sub('', title)  # Trim whitespace
     
     # Capitalize properly (title case)
     if title:
@@ -18,109 +44,205 @@ def clean_title(title):
 
 def is_likely_dish_name(text):
     """Check if text looks like a dish name."""
-    text_lower = text.lower()
-    
-    # Common food-related words that indicate a dish name
-    food_indicators = [
-        'salad', 'soup', 'pasta', 'rice', 'bread', 'cake', 'pie', 'stew', 'curry',
-        'lasagna', 'pizza', 'burger', 'sandwich', 'wrap', 'roll', 'dip', 'sauce',
-        'dressing', 'marinade', 'rub', 'spread', 'hummus', 'falafel', 'ratatouille',
-        'quiche', 'frittata', 'omelette', 'pancake', 'waffle', 'muffin', 'cookie',
-        'brownie', 'pudding', 'ice cream', 'sorbet', 'smoothie', 'juice', 'tea',
-        'coffee', 'cocktail', 'wine', 'beer', 'cheese', 'yogurt', 'granola'
-    ]
-    
-    # Check if text contains food-related words
-    if any(indicator in text_lower for indicator in food_indicators):
-        return True
-    
     # Check for proper noun patterns (likely dish names)
-    if re.match(r'^[A-Z][a-z]+(?:\s+[A-Z][a-z]+)*$', text):
+    if PROPER_NOUN.match(text):
         return True
     
     # Check for descriptive food names
-    if re.match(r'^[A-Z][a-z]+\s+(?:and\s+)?[A-Z][a-z]+(?:\s+[A-Z][a-z]+)*$', text):
+    if DESCRIPTIVE_FOOD_NAME.match(text):
+        return True
+    
+    # Check if text contains food-related words (one scan for all of them; the
+    # anchored patterns above are cheaper, so they go first)
+    if FOOD_INDICATORS.pattern.search(text.lower()):
         return True
     
     return False
 
+# Line shapes treated as section titles (see classify_line)
+TITLE_PATTERNS = [
+    re.compile(r'^[A-Z][A-Za-z\s\-\'&,]{2,50}$'),  # All caps or title case with reasonable length (over 3 chars)
+    re.compile(r'^\d+\.\s+[A-Za-z]'),             # Numbered sections
+    re.compile(r'^[A-Z][A-Za-z\s]{3,}$'),           # Bold or emphasized text (often titles)
+]
+
+# Sub-headings inside a section; they end the current section but never start one
+NON_TITLE_WORDS = {'ingredients', 'instructions', 'directions', 'preparation',
+                   'cooking time', 'servings', 'nutrition', 'tips', 'notes'}
+
+# Line classes produced by classify_line
+BODY, TITLE, BOUNDARY = 0, 1, 2
+
+def classify_line(line):
+    """
+    Classifies a stripped, non-empty line as BODY, TITLE (starts a section) or
+    BOUNDARY (looks like a title, so it ends the current section, but is a
+    generic sub-heading or cleans down to nothing and starts no section).
+    Returns ``(kind, title)``, where ``title`` is the cleaned title for TITLE
+    lines and None otherwise.
+    """
+    title_shaped = ((len(line) > 3 and TITLE_PATTERNS[0].match(line))
+                    or any(p.match(line) for p in TITLE_PATTERNS[1:])
+                    or is_likely_dish_name(line))
+    if not title_shaped:
+        return BODY, None
+    if line.lower() in NON_TITLE_WORDS:
+        return BOUNDARY, None
+    clean_title_text = clean_title(line)
+    if not clean_title_text or len(clean_title_text) < 3:
+        return BOUNDARY, None
+    return TITLE, clean_title_text
+
+def segment_lines(lines):
+    """
+    Splits a page's lines into non-overlapping ``(title, text)`` sections in one
+    pass: every TITLE line opens a section that collects the following BODY
+    lines until the next TITLE or BOUNDARY line. Lines before the first title
+    belong to no section, and sections with 20 characters of text or less are
+    dropped.
+    """
+    sections = []
+    title = None
+    body = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        kind, clean_title_text = classify_line(line)
+        if kind == BODY:
+            if title is not None:
+                body.append(line)
+            continue
+        if title is not None and body and len('\n'.join(body).strip()) > 20:
+            sections.append((title, '\n'.join(body)))
+        title = clean_title_text
+        body = []
+    if title is not None and body and len('\n'.join(body).strip()) > 20:
+        sections.append((title, '\n'.join(body)))
+    return sections
+
 def extract_sections_from_pdf(pdf_path):
-    doc = fitz.open(pdf_path)
+    with metrics.span("pdf_open"):
+        doc = fitz.open(pdf_path)
     sections = []
     
     for page_num in range(len(doc)):
-        page = doc[page_num]
-        text = page.get_text("text")
-        lines = text.split("\n")
-        
-        current_section = None
-        current_text = []
-        potential_titles = []
-        
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-            
-            # Look for potential section titles
-            # Pattern 1: All caps or title case with reasonable length
-            if (re.match(r'^[A-Z][A-Za-z\s\-\'&,]{2,50}$', line) and 
-                len(line) > 3 and len(line) < 100):
-                potential_titles.append(line)
-            
-            # Pattern 2: Lines that look like dish names
-            elif is_likely_dish_name(line):
-                potential_titles.append(line)
-            
-            # Pattern 3: Numbered sections
-            elif re.match(r'^\d+\.\s+[A-Za-z]', line):
-                potential_titles.append(line)
-            
-            # Pattern 4: Bold or emphasized text (often titles)
-            elif re.match(r'^[A-Z][A-Za-z\s]{3,}$', line):
-                potential_titles.append(line)
-        
-        # Process potential titles to find the best section titles
-        for i, title in enumerate(potential_titles):
-            # Skip common non-title words
-            if title.lower() in ['ingredients', 'instructions', 'directions', 'preparation', 
-                               'cooking time', 'servings', 'nutrition', 'tips', 'notes']:
-                continue
-            
-            # Clean the title
-            clean_title_text = clean_title(title)
-            if not clean_title_text or len(clean_title_text) < 3:
-                continue
-            
-            # Collect text until next potential title
-            section_text = []
-            start_collecting = False
-            
-            for line in lines:
-                line = line.strip()
-                if not line:
-                    continue
-                
-                # If we find this title, start collecting
-                if title in line and not start_collecting:
-                    start_collecting = True
-                    continue
-                
-                # If we find another potential title, stop collecting
-                if start_collecting and any(potential_titles[j] in line for j in range(i+1, len(potential_titles))):
-                    break
-                
-                # Collect text
-                if start_collecting and line != title:
-                    section_text.append(line)
-            
-            # Only add sections with substantial content
-            if section_text and len('\n'.join(section_text).strip()) > 20:
+        with metrics.span("page_parse"):
+            text = doc[page_num].get_text("text")
+        with metrics.span("segment"):
+            for section_title, section_text in segment_lines(text.split("\n")):
                 sections.append({
                     "page_number": page_num + 1,
-                    "section_title": clean_title_text,
-                    "text": '\n'.join(section_text)
+                    "section_title": section_title,
+                    "text": section_text
                 })
     
+    metrics.count("pages", len(doc))
+    metrics.count("sections_extracted", len(sections))
     doc.close()
-    return sections 
\ No newline at end of file
+    return sections
+
+def pack_sections(sections):
+    """
+    Packs sections into ``(pages, title_lengths, titles, text_lengths, texts)``:
+    three int arrays and two concatenated strings, which pickle far smaller and
+    faster than a list of dicts when sent back from a worker process.
+    """
+    return (
+        array('i', (sec["page_number"] for sec in sections)),
+        array('i', (len(sec["section_title"]) for sec in sections)),
+        "".join(sec["section_title"] for sec in sections),
+        array('i', (len(sec["text"]) for sec in sections)),
+        "".join(sec["text"] for sec in sections),
+    )
+
+def unpack_sections(payload):
+    """Inverse of ``pack_sections``."""
+    pages, title_lengths, titles, text_lengths, texts = payload
+    sections = []
+    title_pos = text_pos = 0
+    for page, title_len, text_len in zip(pages, title_lengths, text_lengths):
+        sections.append({
+            "page_number": page,
+            "section_title": titles[title_pos:title_pos + title_len],
+            "text": texts[text_pos:text_pos + text_len]
+        })
+        title_pos += title_len
+        text_pos += text_len
+    return sections
+
+def parse_pdf_packed(pdf_path):
+    """
+    Process-pool worker: parse one PDF, returning its packed sections, the
+    parse time and the worker's metrics snapshot (None unless enabled).
+    """
+    start = time.time()
+    with metrics.span("parse_pdf"):
+        payload = pack_sections(extract_sections_from_pdf(pdf_path))
+    return payload, time.time() - start, metrics.snapshot()
+
+def filter_sections(sections, min_text_length=50):
+    """Sections with more than ``min_text_length`` characters of content."""
+    if hasattr(sections, "select"):
+        # Stored sections filter on their length column before decoding any text
+        return sections.select(min_text_length)
+    return [sec for sec in sections if len(sec.get("text", "").strip()) > min_text_length]
+
+def iter_parsed_pdfs(pdf_files, workers=None, store=None, mp_context=None):
+    """
+    Parse PDFs concurrently on a process pool and yield
+    ``(pdf_path, sections, seconds, error)`` in input order as each becomes
+    available; ``sections`` is None when parsing failed. With a
+    ``SectionStore``, unchanged documents are loaded from it instead of being
+    parsed (``sections`` is then a ``StoredSections`` view), and newly parsed
+    ones are added to it. ``mp_context`` picks how pool workers start (e.g.
+    spawn when the caller already runs threads that forking would copy).
+    """
+    stored = {}
+    # Each PDF is hashed once; the key serves both the lookup and the later put
+    keys = {}
+    if store is not None:
+        for pdf_path in pdf_files:
+            start = time.time()
+            keys[pdf_path] = store.key(pdf_path)
+            sections = store.get(keys[pdf_path])
+            if sections is not None:
+                stored[pdf_path] = (sections, time.time() - start)
+    missing = [pdf_path for pdf_path in pdf_files if pdf_path not in stored]
+
+    def finish(pdf_path, payload, seconds, worker_metrics):
+        metrics.merge(worker_metrics)
+        sections = unpack_sections(payload)
+        if store is not None:
+            store.put(keys[pdf_path], sections)
+        return pdf_path, sections, seconds, None
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(missing)))
+    if workers == 1:
+        for pdf_path in pdf_files:
+            if pdf_path in stored:
+                yield (pdf_path, *stored[pdf_path], None)
+                continue
+            try:
+                start = time.time()
+                with metrics.span("parse_pdf"):
+                    sections = extract_sections_from_pdf(pdf_path)
+                if store is not None:
+                    store.put(keys[pdf_path], sections)
+                yield pdf_path, sections, time.time() - start, None
+            except Exception as e:
+                yield pdf_path, None, 0.0, e
+        return
+    # Workers start with empty metrics, so merged snapshots hold only their own work
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context, initializer=metrics.reset) as pool:
+        futures = {pdf_path: pool.submit(parse_pdf_packed, pdf_path) for pdf_path in missing}
+        for pdf_path in pdf_files:
+            if pdf_path in stored:
+                yield (pdf_path, *stored[pdf_path], None)
+                continue
+            try:
+                yield finish(pdf_path, *futures[pdf_path].result())
+            except Exception as e:
+                yield pdf_path, None, 0.0, e
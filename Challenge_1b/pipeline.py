@@ -0,0 +1,114 @@
+import heapq
+import os
+import queue
+import threading
+import time
+
+import metrics
+from pdf_parser import filter_sections, iter_parsed_pdfs
+from relevance import DEFAULT_BATCH_SIZE, cosine_scores, encode_texts, get_embedding, query_text, score_sections
+
+# Parsed documents buffered between the parsing and embedding stages
+DEFAULT_QUEUE_SIZE = 4
+
+_DONE = object()
+
+class TopK:
+    """
+    Incremental top-k over a stream of scored items. Ties are broken by the
+    caller's sequence number, so the result matches a stable sort of
+    everything pushed.
+    """
+
+    def __init__(self, k):
+        self.k = k
+        # Min-heap on (score, -seq): the root is the weakest item kept
+        self.heap = []
+
+    def push(self, score, seq, item):
+        entry = (float(score), -seq, item)
+        if len(self.heap) < self.k:
+            heapq.heappush(self.heap, entry)
+        elif entry[:2] > self.heap[0][:2]:
+            heapq.heapreplace(self.heap, entry)
+
+    def result(self):
+        """Items kept, best first, with their scores."""
+        ordered = sorted(self.heap, key=lambda e: (-e[0], -e[1]))
+        return [e[2] for e in ordered], [e[0] for e in ordered]
+
+def rank_streaming(pdf_files, persona, job, top_n=12, workers=None, batch_size=DEFAULT_BATCH_SIZE,
+                   min_text_length=50, queue_size=DEFAULT_QUEUE_SIZE, store=None, log=print):
+    """
+    Parse, embed and rank as an overlapped pipeline.
+
+    A producer thread drives the parsing process pool and hands each finished
+    document's sections (tagged with the document name and filtered to more
+    than ``min_text_length`` characters, as in the phased pipeline) to a
+    bounded queue. The calling thread encodes section titles in batches as
+    they arrive, scores each batch with ``score_sections`` and keeps a running
+    top-k, so encoding proceeds while later PDFs are still being parsed.
+    ``store`` is an optional ``SectionStore`` passed to ``iter_parsed_pdfs``.
+    Returns ``(ranked_sections, stats)``.
+    """
+    docs = queue.Queue(maxsize=queue_size)
+    stats = {"documents": 0, "sections": 0, "parse_seconds": 0.0, "embed_seconds": 0.0, "batches": 0}
+
+    # The producer thread has no open spans of its own; parsing nests under the caller's
+    parent_span = metrics.current()
+
+    def produce():
+        try:
+            with metrics.within(parent_span):
+                for pdf_file, sections, seconds, error in iter_parsed_pdfs(pdf_files, workers, store):
+                    if error is not None:
+                        log(f"ERROR processing {pdf_file}: {error}")
+                        continue
+                    name = os.path.basename(pdf_file)
+                    # Filter out sections with very little content
+                    kept = filter_sections(sections, min_text_length)
+                    for sec in kept:
+                        sec["document"] = name
+                    stats["parse_seconds"] += seconds
+                    log(f"Parsed {name} ({seconds:.2f} seconds, {len(kept)} sections)")
+                    docs.put(kept)
+        finally:
+            docs.put(_DONE)
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+
+    # Encode the query while the first documents are being parsed
+    query_emb = get_embedding(query_text(persona, job))
+    top = TopK(top_n)
+    pending = []
+
+    def flush():
+        if not pending:
+            return
+        start = time.time()
+        semantic = cosine_scores(encode_texts([sec.get("section_title", "") for sec in pending], batch_size),
+                                 query_emb)
+        batch = score_sections(pending, persona, job, top_n, batch_size=batch_size, semantic_scores=semantic)
+        # Only a batch's own top-k can reach the overall top-k
+        position = {id(sec): i for i, sec in enumerate(pending)}
+        for sec, score in zip(batch["sections"], batch["scores"]):
+            top.push(score, stats["sections"] + position[id(sec)], sec)
+        stats["embed_seconds"] += time.time() - start
+        stats["batches"] += 1
+        stats["sections"] += len(pending)
+        pending.clear()
+
+    while True:
+        item = docs.get()
+        if item is _DONE:
+            break
+        stats["documents"] += 1
+        pending.extend(item)
+        if len(pending) >= batch_size:
+            flush()
+    flush()
+    producer.join()
+
+    ranked, _ = top.result()
+    return ranked, stats
@@ -1,14 +1,45 @@
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
 import numpy as np
+import os
 import re
 import json
+from functools import lru_cache
+from embedding_cache import DEFAULT_MAX_ENTRIES, EmbeddingCache
+from embedding_backend import backend_id, configure_backend, get_backend
+from keyword_matcher import KeywordMatcher
+import metrics
+from model_loader import get_sentence_model
 
-# Choose one of these models:
-#MODEL = SentenceTransformer('all-MiniLM-L6-v2')  # Fast, good quality
-MODEL = SentenceTransformer('multi-qa-MiniLM-L6-cos-v1')  # Optimized for retrieval
-# MODEL = SentenceTransformer('all-distilroberta-v1')  # Good general purpose
-# MODEL = SentenceTransformer('all-mpnet-base-v2')  # Highest quality, slower
+# Choose one of these models (loaded lazily on first use):
+# MODEL_NAME = 'all-MiniLM-L6-v2'  # Fast, good quality
+MODEL_NAME = 'multi-qa-MiniLM-L6-cos-v1'  # Optimized for retrieval
+# MODEL_NAME = 'all-distilroberta-v1'  # Good general purpose
+# MODEL_NAME = 'all-mpnet-base-v2'  # Highest quality, slower
+
+configure_backend(model_name=MODEL_NAME)
+
+def get_model():
+    """Returns the shared SentenceTransformer, loading it on first use."""
+    return get_sentence_model(MODEL_NAME)
+
+def __getattr__(name):
+    # Keeps `from relevance import MODEL` working without loading at import time
+    if name == "MODEL":
+        return get_model()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Section titles encoded per model.encode call
+DEFAULT_BATCH_SIZE = 64
+
+# Persistent embedding store, enabled by configure_embedding_cache or EMBEDDING_CACHE_DIR
+EMBEDDING_CACHE = None
+
+# Weights of the score components combined by score_sections - prioritize title-based ranking
+SCORE_WEIGHTS = {
+    "semantic": 0.5,     # Semantic similarity of title
+    "keyword": 0.25,     # Keyword matching
+    "constraint": 0.15,  # Constraint compliance
+    "quality": 0.1,      # Content quality
+}
 
 GENERIC_TITLES = {"table of contents", "references", "index", "appendix", "acknowledgments"}
 
@@ -37,32 +68,18 @@ def extract_job_keywords(job_text):
     keywords = [word for word in words if word not in stop_words and len(word) > 2]
     return list(set(keywords))
 
-def analyze_content_relevance(text, job_keywords):
-    """
-    Analyze how relevant content is to job requirements using keyword matching.
-    """
-    text_lower = text.lower()
-    relevance_score = 0.0
-    
-    # Count keyword matches
-    for keyword in job_keywords:
-        if keyword in text_lower:
-            relevance_score += 1.0
-    
-    # Normalize by number of keywords
-    if job_keywords:
-        relevance_score /= len(job_keywords)
-    
-    return relevance_score
+@lru_cache(maxsize=64)
+def keyword_matcher(job_keywords: tuple) -> KeywordMatcher:
+    """Compiles the job keywords once per query into a single-scan matcher."""
+    return KeywordMatcher(job_keywords)
 
-def check_constraint_violations(text, job_text):
+@lru_cache(maxsize=64)
+def extract_constraints(job_text):
     """
-    Check for any constraint violations mentioned in the job.
+    Extract constraint words from job (words that follow an indicator of a
+    requirement/restriction), compiled once per job into a matcher.
     """
-    text_lower = text.lower()
     job_lower = job_text.lower()
-    
-    # Extract constraint words from job (words that indicate requirements/restrictions)
     constraint_indicators = ['must', 'should', 'need', 'require', 'only', 'no', 'not', 'without', 'exclude', 'avoid']
     job_words = re.findall(r'\b[a-zA-Z]+\b', job_lower)
     
@@ -73,69 +90,204 @@ def check_constraint_violations(text, job_text):
             constraint_word = job_words[i + 1]
             if len(constraint_word) > 2:
                 constraints.append(constraint_word)
+    return constraints, KeywordMatcher(constraints)
+
+def analyze_content_relevance(text, job_keywords):
+    """
+    Analyze how relevant content is to job requirements using keyword matching.
+    """
+    if not job_keywords:
+        return 0.0
+    
+    # Count keyword matches, scanning the text once for all keywords
+    present = keyword_matcher(tuple(job_keywords)).present(text.lower())
+    relevance_score = float(sum(1 for keyword in job_keywords if keyword in present))
+    
+    # Normalize by number of keywords
+    return relevance_score / len(job_keywords)
+
+def check_constraint_violations(text, job_text):
+    """
+    Check for any constraint violations mentioned in the job.
+    """
+    constraints, matcher = extract_constraints(job_text)
+    if not constraints:
+        return 1.0
     
     # Check if text violates any constraints
-    violation_penalty = 0.0
-    for constraint in constraints:
-        if constraint in text_lower:
-            violation_penalty += 0.5  # Penalty for constraint violation
+    present = matcher.present(text.lower())
+    violation_penalty = 0.5 * sum(1 for constraint in constraints if constraint in present)
     
     return max(0.0, 1.0 - violation_penalty)
 
+def keyword_components(titles: list, texts: list, job_text: str):
+    """
+    Keyword and constraint components of ``score_sections`` for many sections
+    at once: equal to ``analyze_content_relevance`` and
+    ``check_constraint_violations`` applied per title and text, but with
+    keywords and constraints matched together by ``KeywordMatcher.presence``
+    (one substring pass per term over all titles and texts).
+    """
+    n = len(titles)
+    job_keywords = extract_job_keywords(job_text)
+    constraints, _ = extract_constraints(job_text)
+    matcher = keyword_matcher(tuple(dict.fromkeys(job_keywords + constraints)))
+    presence = matcher.presence([t.lower() for t in titles] + [t.lower() for t in texts])
+    column = {term: i for i, term in enumerate(matcher.terms)}
+    title_hits, text_hits = presence[:n], presence[n:]
+
+    keyword = np.zeros(n)
+    if job_keywords:
+        cols = [column[k] for k in job_keywords]
+        # Title matches weigh more than content matches
+        keyword = (title_hits[:, cols].sum(axis=1) / len(job_keywords) * 0.7
+                   + text_hits[:, cols].sum(axis=1) / len(job_keywords) * 0.3)
+
+    constraint = np.ones(n)
+    if constraints:
+        # Repeated constraint words count once per occurrence in the job, as in check_constraint_violations
+        cols = [column[c] for c in constraints]
+        violations = np.maximum(title_hits[:, cols].sum(axis=1), text_hits[:, cols].sum(axis=1))
+        constraint = np.maximum(0.0, 1.0 - 0.5 * violations)
+    return keyword, constraint
+
+def configure_embedding_cache(cache_dir: str, max_entries: int = DEFAULT_MAX_ENTRIES):
+    """Enables (or, with an empty ``cache_dir``, disables) the persistent embedding cache."""
+    global EMBEDDING_CACHE
+    # Keyed by backend so quantized ONNX vectors never mix with PyTorch ones
+    EMBEDDING_CACHE = EmbeddingCache(cache_dir, backend_id(), max_entries) if cache_dir else None
+
+configure_embedding_cache(os.environ.get("EMBEDDING_CACHE_DIR", ""))
+
 def get_embedding(text: str) -> np.ndarray:
     """Encodes a text string into a vector embedding."""
-    return MODEL.encode([text], convert_to_tensor=True).cpu().numpy()[0]
+    return encode_texts([text])[0]
 
-def rank_sections_by_relevance(sections: list, persona: str, job: str, top_n: int = 8) -> list:
+def encode_texts(texts: list, batch_size: int = DEFAULT_BATCH_SIZE) -> np.ndarray:
     """
-    Generic relevance ranking that works for any domain and job requirements.
+    Encodes texts into a (len(texts), dim) matrix, running each distinct text
+    through the model once, in batches of ``batch_size``.
+    """
+    unique = list(dict.fromkeys(texts))
+    if not unique:
+        return np.zeros((0, get_backend().dimension), dtype=np.float32)
+
+    def encode(batch):
+        with metrics.span("embed"):
+            metrics.count("texts_embedded", len(batch))
+            return get_backend().encode(batch, batch_size=batch_size)
+
+    if EMBEDDING_CACHE is not None:
+        unique_emb = EMBEDDING_CACHE.get_many(unique, encode)
+    else:
+        unique_emb = encode(unique)
+    row = {text: i for i, text in enumerate(unique)}
+    return unique_emb[[row[text] for text in texts]]
+
+def query_text(persona: str, job: str) -> str:
+    """The text encoded for a persona/job query."""
+    return f"{persona}. Task: {job}"
+
+def cosine_matrix(queries: np.ndarray, matrix: np.ndarray) -> np.ndarray:
+    """(len(queries), len(matrix)) cosine similarities of every query with every row, in one product."""
+    norms = np.linalg.norm(matrix, axis=1)
+    norms[norms == 0] = 1.0
+    query_norms = np.linalg.norm(queries, axis=1)
+    query_norms[query_norms == 0] = 1.0
+    return (queries @ matrix.T) / np.outer(query_norms, norms)
+
+def cosine_scores(matrix: np.ndarray, vector: np.ndarray) -> np.ndarray:
+    """Cosine similarity of every row of ``matrix`` with ``vector`` in one matrix product."""
+    norms = np.linalg.norm(matrix, axis=1)
+    norms[norms == 0] = 1.0
+    vector_norm = np.linalg.norm(vector) or 1.0
+    return (matrix @ vector) / (norms * vector_norm)
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Indices of the ``k`` highest scores, best first, using ``argpartition``
+    instead of a full sort. Ties keep input order, like a stable sort would.
     """
-    # Extract keywords from job description
-    job_keywords = extract_job_keywords(job)
+    n = len(scores)
+    if k <= 0 or n == 0:
+        return np.zeros(0, dtype=np.int64)
+    if k < n:
+        threshold = scores[np.argpartition(-scores, k - 1)[:k]].min()
+        above = np.flatnonzero(scores > threshold)
+        ties = np.flatnonzero(scores == threshold)[:k - len(above)]
+        candidates = np.concatenate([above, ties])
+    else:
+        candidates = np.arange(n)
+    return candidates[np.lexsort((candidates, -scores[candidates]))]
+
+@metrics.timed("score")
+def score_sections(sections: list, persona: str, job: str, top_n: int = 8,
+                   weights: dict = None, batch_size: int = DEFAULT_BATCH_SIZE,
+                   semantic_scores: np.ndarray = None) -> dict:
+    """
+    Scores every section with NumPy arrays, one per component, and returns the
+    top ``top_n`` as ``{"sections", "scores", "components"}``, where
+    ``components`` maps each name in ``SCORE_WEIGHTS`` to its values for the
+    returned sections. Sections with generic titles are skipped. Pass
+    ``semantic_scores`` (one per input section) to reuse precomputed
+    title/query similarities instead of encoding.
+    """
+    weights = {**SCORE_WEIGHTS, **(weights or {})}
     
-    # Create query for semantic similarity
-    query = f"{persona}. Task: {job}"
-    query_emb = get_embedding(query).reshape(1, -1)
-
-    scored_sections = []
-    for sec in sections:
-        section_title = sec.get('section_title', '')
-        section_text = sec.get('text', '')
-        
-        if section_title.strip().lower() in GENERIC_TITLES:
-            continue
-
-        # 1. Semantic similarity score - use ONLY section title
-        title_emb = get_embedding(section_title).reshape(1, -1)
-        semantic_score = cosine_similarity(query_emb, title_emb)[0][0]
-        
-        # 2. Keyword relevance score - check both title and content
-        title_keyword_score = analyze_content_relevance(section_title, job_keywords)
-        content_keyword_score = analyze_content_relevance(section_text, job_keywords)
-        keyword_score = (title_keyword_score * 0.7) + (content_keyword_score * 0.3)  # Weight title more
-        
-        # 3. Constraint compliance score - check both title and content
-        title_constraint_score = check_constraint_violations(section_title, job)
-        content_constraint_score = check_constraint_violations(section_text, job)
-        constraint_score = min(title_constraint_score, content_constraint_score)  # Use worst score
-        
-        # 4. Content quality score (prefer longer, more substantial content)
-        content_length = len(section_text.strip())
-        quality_score = min(1.0, content_length / 500.0)  # Normalize to 0-1
-        
-        # 5. Title relevance score (redundant now, but kept for clarity)
-        title_relevance = title_keyword_score
-        
-        # Combine all scores with weights - prioritize title-based ranking
-        final_score = (
-            semantic_score * 0.5 +      # Semantic similarity of title (50%)
-            keyword_score * 0.25 +      # Keyword matching (25%)
-            constraint_score * 0.15 +   # Constraint compliance (15%)
-            quality_score * 0.1         # Content quality (10%)
-        )
-        
-        scored_sections.append((sec, final_score))
-
-    # Sort by final score and return top sections
-    ranked = sorted(scored_sections, key=lambda x: x[1], reverse=True)
-    return [s for s, _ in ranked[:top_n]]
\ No newline at end of file
+    keep = [
+        i for i, sec in enumerate(sections)
+        if sec.get('section_title', '').strip().lower() not in GENERIC_TITLES
+    ]
+    sections = [sections[i] for i in keep]
+    titles = [sec.get('section_title', '') for sec in sections]
+    texts = [sec.get('text', '') for sec in sections]
+    n = len(sections)
+
+    # 1. Semantic similarity score - use ONLY section title, all titles encoded in batches
+    if semantic_scores is not None:
+        semantic = np.asarray(semantic_scores, dtype=np.float64)[keep]
+    else:
+        # Create query for semantic similarity
+        query_emb = get_embedding(query_text(persona, job))
+        semantic = cosine_scores(encode_texts(titles, batch_size), query_emb).astype(np.float64)
+
+    # 2. Keyword relevance score - check both title and content, weight title more
+    # 3. Constraint compliance score - check both title and content, use worst score
+    keyword, constraint = keyword_components(titles, texts, job)
+
+    # 4. Content quality score (prefer longer, more substantial content), normalized to 0-1
+    quality = np.minimum(1.0, np.fromiter((len(t.strip()) for t in texts), np.float64, n) / 500.0)
+
+    metrics.count("sections_scored", n)
+    components = {"semantic": semantic, "keyword": keyword, "constraint": constraint, "quality": quality}
+    final = sum(weights[name] * values for name, values in components.items())
+
+    top = top_k_indices(final, top_n)
+    return {
+        "sections": [sections[i] for i in top],
+        "scores": final[top],
+        "components": {name: values[top] for name, values in components.items()},
+    }
+
+def score_queries(sections: list, queries: list, top_n: int = 8,
+                  weights: dict = None, batch_size: int = DEFAULT_BATCH_SIZE) -> list:
+    """
+    Scores one set of sections against many ``(persona, job)`` queries. Section
+    titles are encoded once, all queries in one batch, and their similarities
+    computed as a single query-by-section matrix; returns one
+    ``score_sections`` result per query.
+    """
+    title_emb = encode_texts([sec.get('section_title', '') for sec in sections], batch_size)
+    query_emb = encode_texts([query_text(persona, job) for persona, job in queries], batch_size)
+    similarity = cosine_matrix(query_emb, title_emb)
+    return [
+        score_sections(sections, persona, job, top_n, weights, batch_size, semantic_scores=similarity[q])
+        for q, (persona, job) in enumerate(queries)
+    ]
+
+def rank_sections_by_relevance(sections: list, persona: str, job: str, top_n: int = 8,
+                               batch_size: int = DEFAULT_BATCH_SIZE) -> list:
+    """
+    Generic relevance ranking that works for any domain and job requirements.
+    """
+    return score_sections(sections, persona, job, top_n, batch_size=batch_size)["sections"]
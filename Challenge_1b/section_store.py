@@ -0,0 +1,167 @@
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+import numpy as np
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# File layout: header, then int32 pages, int32 content lengths, int64 title
+# offsets and int64 text offsets (count + 1 each, byte offsets into the blob),
+# then one UTF-8 blob holding every title followed by every text.
+MAGIC = b"SECS"
+HEADER = struct.Struct("<4sII")  # magic, format version, section count
+FORMAT_VERSION = 1
+
+def file_digest(path, chunk_size=1 << 20):
+    """SHA-256 hex digest of a file's contents."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+class StoredSections:
+    """
+    Read-only, memory-mapped view of one document's sections.
+
+    Page numbers and content lengths are NumPy arrays over the mapping; titles
+    and texts are decoded from the blob only when a section is accessed, so
+    short sections can be filtered out without materializing them.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"Not a section store file: {path}")
+        offset = HEADER.size
+        self.pages = np.frombuffer(self._mm, np.int32, count, offset)
+        offset += 4 * count
+        # Length of each text after strip(), used for the minimum-content filter
+        self.content_lengths = np.frombuffer(self._mm, np.int32, count, offset)
+        offset += 4 * count
+        self.title_offsets = np.frombuffer(self._mm, np.int64, count + 1, offset)
+        offset += 8 * (count + 1)
+        self.text_offsets = np.frombuffer(self._mm, np.int64, count + 1, offset)
+        self.blob_start = offset + 8 * (count + 1)
+
+    def __len__(self):
+        return len(self.pages)
+
+    def _decode(self, offsets, i):
+        return self._mm[self.blob_start + offsets[i]:self.blob_start + offsets[i + 1]].decode("utf-8")
+
+    def __getitem__(self, i):
+        return {
+            "page_number": int(self.pages[i]),
+            "section_title": self._decode(self.title_offsets, i),
+            "text": self._decode(self.text_offsets, i)
+        }
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def select(self, min_text_length=0):
+        """Sections whose stripped text is longer than ``min_text_length``, as dicts."""
+        return [self[i] for i in np.flatnonzero(self.content_lengths > min_text_length)]
+
+def write_sections(path, sections):
+    """Serialize ``extract_sections_from_pdf`` output into the store file format."""
+    titles = [sec["section_title"].encode("utf-8") for sec in sections]
+    texts = [sec["text"].encode("utf-8") for sec in sections]
+    count = len(sections)
+    title_offsets = np.zeros(count + 1, np.int64)
+    np.cumsum([len(t) for t in titles], out=title_offsets[1:])
+    # Texts follow all titles in the same blob
+    text_offsets = np.full(count + 1, title_offsets[-1], np.int64)
+    text_offsets[1:] += np.cumsum([len(t) for t in texts], dtype=np.int64)
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, count))
+        f.write(np.fromiter((sec["page_number"] for sec in sections), np.int32, count).tobytes())
+        f.write(np.fromiter((len(sec["text"].strip()) for sec in sections), np.int32, count).tobytes())
+        f.write(title_offsets.tobytes())
+        f.write(text_offsets.tobytes())
+        f.write(b"".join(titles))
+        f.write(b"".join(texts))
+
+class SectionStore:
+    """
+    On-disk store of parsed sections keyed by PDF content hash plus parser
+    version, so re-running a collection with a different persona or job skips
+    PDF parsing for unchanged documents.
+
+    Entries are written via temp file + rename, so readers in other processes
+    never observe partial files. A hit refreshes the entry's mtime, and writes
+    evict the least recently used entries once the store grows beyond
+    ``max_bytes``.
+    """
+
+    def __init__(self, store_dir, parser_version, max_bytes=DEFAULT_MAX_BYTES):
+        self.store_dir = store_dir
+        self.parser_version = str(parser_version)
+        self.max_bytes = max_bytes
+        os.makedirs(store_dir, exist_ok=True)
+
+    def key(self, pdf_path):
+        """Store key of ``pdf_path``: hashes its contents."""
+        return hashlib.sha256((file_digest(pdf_path) + ":" + self.parser_version).encode()).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.store_dir, key + ".sec")
+
+    def get(self, key):
+        """Return a ``StoredSections`` view for ``key``, or None on a miss."""
+        entry = self._entry_path(key)
+        try:
+            sections = StoredSections(entry)
+            os.utime(entry)
+        except (OSError, ValueError, struct.error):
+            return None
+        return sections
+
+    def put(self, key, sections):
+        """Store ``sections`` under ``key`` and evict old entries if needed."""
+        entry = self._entry_path(key)
+        fd, tmp_path = tempfile.mkstemp(dir=self.store_dir, suffix=".tmp")
+        os.close(fd)
+        try:
+            write_sections(tmp_path, sections)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, entry)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+        self.evict()
+
+    def evict(self):
+        """Delete least recently used entries until the store fits in ``max_bytes``."""
+        entries = []
+        total = 0
+        with os.scandir(self.store_dir) as it:
+            for e in it:
+                if not e.name.endswith(".sec"):
+                    continue
+                try:
+                    st = e.stat()
+                except OSError:
+                    continue  # removed by another process
+                entries.append((st.st_mtime, st.st_size, e.path))
+                total += st.st_size
+        if total <= self.max_bytes:
+            return
+        entries.sort()
+        for _, size, path in entries:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+            if total <= self.max_bytes:
+                break
@@ -0,0 +1,302 @@
+import json
+import multiprocessing
+import os
+import queue
+import socket
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import ThreadingMixIn, UnixStreamServer
+from main import build_output, load_queries, summarize_sections
+from model_loader import prewarm
+from pdf_parser import filter_sections, iter_parsed_pdfs
+from relevance import cosine_scores, encode_texts, query_text, score_sections
+
+DEFAULT_PORT = 8080
+# How long the first query of a batch waits for others to arrive
+DEFAULT_BATCH_WINDOW_MS = 5
+MAX_QUERY_BATCH = 64
+
+class QueryEncoder:
+    """
+    Encodes query texts on one background thread. Queries submitted within
+    ``window_ms`` of each other are encoded together in a single
+    ``encode_texts`` call; each caller gets its vector through a ``Future``.
+    """
+
+    def __init__(self, window_ms=DEFAULT_BATCH_WINDOW_MS, max_batch=MAX_QUERY_BATCH):
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self.pending = queue.Queue()
+        self.batches = 0
+        self.encoded = 0
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def encode(self, text):
+        future = Future()
+        self.pending.put((text, future))
+        return future.result()
+
+    def _run(self):
+        while True:
+            batch = [self.pending.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                vectors = encode_texts([text for text, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.encoded += len(batch)
+            for (_, future), vector in zip(batch, vectors):
+                future.set_result(vector)
+
+class BadRequest(ValueError):
+    """A request field has an invalid value; answered with 400."""
+
+class UnknownCollection(LookupError):
+    """The requested collection is not loaded; answered with 404."""
+
+class Collection:
+    """
+    A registered collection: its parsed sections and, once ``embed`` has
+    run, their title embeddings, kept in memory.
+    """
+
+    def __init__(self, name, path, workers=None, store=None, mp_context=None):
+        input_json = os.path.join(path, "challenge1b_input.json")
+        if not os.path.exists(input_json):
+            input_json = os.path.join(path, "input.json")
+        pdf_files, _ = load_queries(input_json)
+        pdfs_folder = os.path.join(path, "PDFs")
+        self.name = name
+        self.pdf_files = [os.path.join(pdfs_folder, f) for f in pdf_files]
+        self.sections = []
+        existing = [f for f in self.pdf_files if os.path.exists(f)]
+        for pdf_file, sections, _, error in iter_parsed_pdfs(existing, workers, store, mp_context):
+            if error is not None:
+                print(f"ERROR processing {pdf_file}: {error}")
+                continue
+            # Filter out sections with very little content
+            for sec in filter_sections(sections, 50):
+                sec["document"] = os.path.basename(pdf_file)
+                self.sections.append(sec)
+        self.title_emb = None
+
+    def embed(self):
+        self.title_emb = encode_texts([sec.get("section_title", "") for sec in self.sections])
+
+    def analyze(self, persona, job_to_be_done, query_emb, top_n=12):
+        """Rank and summarize for one query; returns the ``challenge1b_output.json`` document."""
+        semantic = cosine_scores(self.title_emb, query_emb)
+        ranked_sections = score_sections(self.sections, persona, job_to_be_done, top_n,
+                                         semantic_scores=semantic)["sections"]
+        summaries = summarize_sections(ranked_sections, persona, job_to_be_done)
+        return build_output(self.name, self.pdf_files, persona, job_to_be_done, summaries, "collections")
+
+class AnalysisService:
+    """Registered collections plus the shared query encoder."""
+
+    def __init__(self, workers=None, store=None, window_ms=DEFAULT_BATCH_WINDOW_MS, top_n=12):
+        self.workers = workers
+        self.store = store
+        self.top_n = top_n
+        self.encoder = QueryEncoder(window_ms)
+        self.collections = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, path):
+        """Parse and add a collection while serving; parse workers are spawned, since forking would copy our threads."""
+        start = time.time()
+        collection = Collection(name, path, self.workers, self.store, multiprocessing.get_context("spawn"))
+        return self.add(collection, start)
+
+    def add(self, collection, start=None):
+        """Embed a parsed collection's titles and make it queryable."""
+        start = start or time.time()
+        collection.embed()
+        with self._lock:
+            self.collections[collection.name] = collection
+        print(f"Registered collection '{collection.name}': {len(collection.sections)} sections "
+              f"({time.time() - start:.2f} seconds)")
+        return collection
+
+    def query(self, request):
+        name = request["collection"]
+        collection = self.collections.get(name) if isinstance(name, str) else None
+        if collection is None:
+            raise UnknownCollection(f"Unknown collection: {name}")
+        persona = request["persona"]
+        job_to_be_done = request["job_to_be_done"]
+        # Accept the input file's {"role": ...} / {"task": ...} objects or plain strings
+        if isinstance(persona, dict):
+            persona = persona["role"]
+        if isinstance(job_to_be_done, dict):
+            job_to_be_done = job_to_be_done["task"]
+        top_n = request.get("top_n", self.top_n)
+        if isinstance(top_n, bool) or not isinstance(top_n, int) or top_n < 1:
+            raise BadRequest(f"top_n must be a positive integer, got {top_n!r}")
+        query_emb = self.encoder.encode(query_text(persona, job_to_be_done))
+        return collection.analyze(persona, job_to_be_done, query_emb, top_n)
+
+    def status(self):
+        return {
+            "status": "ok",
+            "collections": {name: {"documents": len(c.pdf_files), "sections": len(c.sections)}
+                            for name, c in self.collections.items()},
+            "encode_batches": self.encoder.batches,
+            "queries_encoded": self.encoder.encoded
+        }
+
+class AnalysisHandler(BaseHTTPRequestHandler):
+    """
+    ``GET /health`` reports registered collections. ``POST /query`` takes
+    ``{"collection", "persona", "job_to_be_done"}`` (plus an optional positive
+    integer ``top_n``) and returns the same JSON
+    as ``challenge1b_output.json``. ``POST /collections`` takes ``{"name", "path"}``
+    and registers a collection folder.
+    """
+
+    service = None
+    protocol_version = "HTTP/1.1"
+
+    def address_string(self):
+        # Unix socket clients have no host address
+        return self.client_address[0] if self.client_address else "unix"
+
+    def _send(self, status, payload, started=None):
+        body = json.dumps(payload, indent=2, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        if started is not None:
+            self.send_header("X-Processing-Ms", f"{(time.time() - started) * 1000:.1f}")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path in ("/health", "/collections"):
+            self._send(200, self.service.status())
+        else:
+            self._send(404, {"error": f"Not found: {self.path}"})
+
+    def do_POST(self):
+        started = time.time()
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError as e:
+            self._send(400, {"error": f"Invalid JSON: {e}"})
+            return
+        if not isinstance(request, dict):
+            self._send(400, {"error": "Bad request: body must be a JSON object"})
+            return
+        try:
+            if self.path == "/query":
+                self._send(200, self.service.query(request), started)
+            elif self.path == "/collections":
+                collection = self.service.register(request["name"], request["path"])
+                self._send(200, {"name": collection.name, "sections": len(collection.sections)}, started)
+            else:
+                self._send(404, {"error": f"Not found: {self.path}"})
+        except UnknownCollection as e:
+            self._send(404, {"error": str(e)})
+        except KeyError as e:
+            self._send(400, {"error": f"Bad request: missing field {e}"})
+        except (BadRequest, TypeError, OSError) as e:
+            self._send(400, {"error": f"Bad request: {e}"})
+        except Exception as e:
+            self._send(500, {"error": str(e)})
+
+class ThreadingUnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+        UnixStreamServer.server_bind(self)
+        # BaseHTTPRequestHandler expects these from HTTPServer
+        self.server_name = socket.gethostname()
+        self.server_port = 0
+
+def find_collections(root):
+    """Collection folders under ``root``: those with an input JSON and a PDFs folder."""
+    found = []
+    for item in sorted(os.listdir(root)):
+        path = os.path.join(root, item)
+        has_input = (os.path.exists(os.path.join(path, "challenge1b_input.json"))
+                     or os.path.exists(os.path.join(path, "input.json")))
+        if has_input and os.path.isdir(os.path.join(path, "PDFs")):
+            found.append((item, path))
+    return found
+
+def serve(service, host="127.0.0.1", port=DEFAULT_PORT, socket_path=None):
+    AnalysisHandler.service = service
+    if socket_path:
+        server = ThreadingUnixHTTPServer(socket_path, AnalysisHandler)
+        print(f"Serving on unix socket {socket_path}")
+    else:
+        server = ThreadingHTTPServer((host, port), AnalysisHandler)
+        print(f"Serving on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    import argparse
+    from embedding_backend import BACKENDS, configure_backend
+    from pdf_parser import PARSER_VERSION
+    from relevance import configure_embedding_cache
+    from section_store import SectionStore
+    parser = argparse.ArgumentParser(description="Serve persona/job analysis over HTTP with warm models")
+    parser.add_argument("--root", default=".", help="Register every collection folder found here")
+    parser.add_argument("--collection", action="append", default=[],
+                        help="Register only this collection folder (repeatable)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--socket", type=str, help="Listen on this Unix socket instead of TCP")
+    parser.add_argument("--batch-window-ms", type=float, default=DEFAULT_BATCH_WINDOW_MS,
+                        help="Wait this long to batch concurrent queries into one encode call")
+    parser.add_argument("--parse-workers", type=int, default=None,
+                        help="Processes used to parse PDFs at registration (default: CPU count)")
+    parser.add_argument("--section-store", type=str, help="Reuse parsed sections of unchanged PDFs from this folder")
+    parser.add_argument("--backend", choices=BACKENDS, help="Embedding backend (default: $EMBEDDING_BACKEND or torch)")
+    parser.add_argument("--onnx-dir", type=str, help="Folder with the exported ONNX model (see export_onnx.py)")
+    parser.add_argument("--embedding-cache", type=str, help="Persist title embeddings in this folder")
+    args = parser.parse_args()
+
+    configure_backend(args.backend, onnx_dir=args.onnx_dir)
+    if args.embedding_cache or args.backend:
+        configure_embedding_cache(args.embedding_cache or os.environ.get("EMBEDDING_CACHE_DIR", ""))
+    store = SectionStore(args.section_store, PARSER_VERSION) if args.section_store else None
+    if args.collection:
+        collections = [(os.path.basename(os.path.normpath(path)), path) for path in args.collection]
+    else:
+        collections = find_collections(args.root)
+    # Parse before loading models or starting threads, so the parse pool forks a single-threaded process
+    parsed = []
+    for name, path in collections:
+        start = time.time()
+        parsed.append(Collection(name, path, args.parse_workers, store))
+        print(f"Parsed collection '{name}' in {time.time() - start:.2f} seconds")
+
+    start = time.time()
+    prewarm()
+    print(f"Models loaded in {time.time() - start:.2f} seconds")
+    service = AnalysisService(args.parse_workers, store, args.batch_window_ms)
+    for collection in parsed:
+        service.add(collection)
+    serve(service, args.host, args.port, args.socket)
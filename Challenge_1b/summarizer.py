@@ -1,14 +1,5 @@
-import nltk
-import numpy as np
-import networkx as nx
-from sklearn.feature_extraction.text import TfidfVectorizer
 import re
-
-# Download required NLTK data if not already present
-try:
-    nltk.data.find('tokenizers/punkt')
-except LookupError:
-    nltk.download('punkt')
+from model_loader import get_nltk
 
 def clean_sentence(sentence):
     """Clean and normalize a sentence."""
@@ -30,7 +21,7 @@ def summarize_text(text, min_sentences=1, max_sentences=3):
     
     try:
         # Fast sentence tokenization
-        sentences = nltk.sent_tokenize(text)
+        sentences = get_nltk().sent_tokenize(text)
         sentences = [clean_sentence(s) for s in sentences if clean_sentence(s) and len(clean_sentence(s)) > 10]
         
         if not sentences:
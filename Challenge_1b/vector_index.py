@@ -0,0 +1,375 @@
+import bisect
+import fcntl
+import json
+import os
+import tempfile
+import time
+import numpy as np
+from embedding_backend import backend_id
+from pdf_parser import filter_sections, iter_parsed_pdfs
+from relevance import DEFAULT_BATCH_SIZE, encode_texts, get_embedding, query_text, score_sections, top_k_indices
+from section_store import StoredSections, file_digest, write_sections
+
+INDEX_KINDS = ("auto", "flat", "ivf")
+# "auto" switches from exact flat search to IVF at this many sections
+IVF_MIN_ROWS = 10_000
+# Inverted lists probed per query in IVF mode
+DEFAULT_NPROBE = 8
+# Candidates pulled from the index before full scoring
+DEFAULT_SHORTLIST = 200
+# Appends retrain the IVF lists once the index has grown this much since the
+# last training (the list count, sqrt of the rows, is then too small) ...
+IVF_RETRAIN_GROWTH = 2.0
+# ... or once the largest list holds this many times the average list size
+IVF_RETRAIN_IMBALANCE = 4.0
+IVF_FILES = ("centroids", "assignments", "list_rows", "list_offsets")
+# Layout of index.json and the data files; other versions are rebuilt
+FORMAT_VERSION = 2
+
+def normalize_rows(matrix):
+    """Scales rows to unit length so inner products are cosine similarities."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+def train_ivf(vectors, nlist, iterations=10, sample_size=256, seed=0, chunk_size=65536):
+    """
+    Spherical k-means over unit vectors: returns ``(centroids, assignments)``.
+    Centroids are trained on at most ``sample_size`` rows per list, then every
+    row is assigned to its nearest centroid in chunks to bound memory.
+    """
+    rng = np.random.default_rng(seed)
+    n = len(vectors)
+    sample = vectors[np.sort(rng.choice(n, min(n, nlist * sample_size), replace=False))]
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        labels = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, sample)
+        counts = np.bincount(labels, minlength=nlist)
+        empty = counts == 0
+        # Re-seed empty lists from random rows
+        sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+        centroids = normalize_rows(sums)
+    return centroids, assign_ivf(vectors, centroids, chunk_size)
+
+def assign_ivf(vectors, centroids, chunk_size=65536):
+    """Nearest centroid of every row, computed in chunks to bound memory."""
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), chunk_size):
+        block = np.asarray(vectors[start:start + chunk_size])
+        assignments[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return assignments
+
+def _generation():
+    return str(int(time.time() * 1e6))
+
+def _file_names(files):
+    """Every data file named in an ``index.json`` ``files`` map."""
+    names = []
+    for value in files.values():
+        if isinstance(value, list):
+            names.extend(name for _, name in value)
+        else:
+            names.append(value)
+    return names
+
+def _doc_ids(documents, first_id):
+    """Document id of every row of ``documents``, numbering them from ``first_id``."""
+    return np.repeat(np.arange(first_id, first_id + len(documents), dtype=np.int32),
+                     [doc["count"] for doc in documents])
+
+def _append_rows(path, offset, array):
+    """Writes ``array`` at byte ``offset`` of a raw data file, dropping anything a crashed writer left after it."""
+    with open(path, "r+b" if os.path.exists(path) else "wb") as f:
+        f.seek(offset)
+        f.write(np.ascontiguousarray(array).tobytes())
+        f.truncate()
+        f.flush()
+        os.fsync(f.fileno())
+
+class SegmentedSections:
+    """Row-addressed view over section store files that each hold a consecutive range of rows."""
+
+    def __init__(self, segments):
+        self.starts = [start for start, _ in segments]
+        self.parts = [part for _, part in segments]
+
+    def __getitem__(self, row):
+        i = bisect.bisect_right(self.starts, row) - 1
+        return self.parts[i][row - self.starts[i]]
+
+class VectorIndex:
+    """
+    Persistent index of section title embeddings for a corpus of PDFs.
+
+    ``index.json`` lists the indexed documents (path, name, content hash and
+    row range) and names the data files: unit-length float32 vectors and int32
+    document ids as raw append-only files, the sections in ``section_store``
+    files holding consecutive row ranges, and for IVF the centroids, each
+    row's list and the rows grouped by list. Data files are loaded
+    memory-mapped. Updates serialize on an ``fcntl`` lock and atomically
+    replace ``index.json``; readers only look at the rows it lists, so rows
+    appended after it was read are invisible to them.
+
+    New documents are appended: their rows go to the end of the data files and,
+    for IVF, to the nearest existing centroid, so nothing already indexed is
+    copied or decoded. A full rebuild (a new generation of every file) only
+    happens when an indexed document changed, the index kind changes, the
+    embedding backend changed, or the IVF lists have drifted (see
+    ``IVF_RETRAIN_GROWTH`` and ``IVF_RETRAIN_IMBALANCE``).
+    """
+
+    def __init__(self, index_dir, kind="auto", nprobe=DEFAULT_NPROBE):
+        self.dir = index_dir
+        self.kind = kind
+        self.nprobe = nprobe
+        os.makedirs(index_dir, exist_ok=True)
+        self.index_path = os.path.join(index_dir, "index.json")
+        self.lock_path = os.path.join(index_dir, "lock")
+        self._load()
+
+    def _path(self, name):
+        return os.path.join(self.dir, name)
+
+    def _load(self):
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                self.meta = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self.meta = None
+        if self.meta is not None and self.meta.get("format") != FORMAT_VERSION:
+            # Written by an older version: rebuilt from scratch on the next update
+            self._stale = _file_names(self.meta["files"])
+            self.meta = None
+        if self.meta is None:
+            self.meta = {"format": FORMAT_VERSION, "model": None, "kind": "flat", "rows": 0, "dim": 0,
+                         "trained_rows": 0, "documents": [], "files": {}}
+        files = self.meta["files"]
+        rows, dim = self.meta["rows"], self.meta["dim"]
+        self.vectors = self.sections = self.centroids = self.assignments = None
+        self.list_rows = self.list_offsets = None
+        self.doc_ids = np.zeros(0, dtype=np.int32)
+        if rows:
+            self.vectors = np.memmap(self._path(files["vectors"]), np.float32, "r", shape=(rows, dim))
+            self.doc_ids = np.memmap(self._path(files["doc_ids"]), np.int32, "r", shape=(rows,))
+            self.sections = SegmentedSections([(start, StoredSections(self._path(name)))
+                                               for start, name in files["sections"]])
+        if self.meta["kind"] == "ivf":
+            self.centroids = np.load(self._path(files["centroids"]), mmap_mode="r")
+            self.assignments = np.memmap(self._path(files["assignments"]), np.int32, "r", shape=(rows,))
+            self.list_rows = np.load(self._path(files["list_rows"]), mmap_mode="r")
+            self.list_offsets = np.load(self._path(files["list_offsets"]), mmap_mode="r")
+
+    def __len__(self):
+        return self.meta["rows"]
+
+    def update(self, pdf_files, workers=None, store=None, min_text_length=50, batch_size=DEFAULT_BATCH_SIZE,
+               log=print):
+        """
+        Adds ``pdf_files`` that are new or changed since they were indexed
+        (parsing them via ``iter_parsed_pdfs``). New documents are appended;
+        see the class docstring for when the index is rebuilt instead. Other
+        indexed documents are kept. Returns the number of documents added.
+        """
+        with open(self.lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            self._load()  # pick up documents other processes indexed
+            model = backend_id()
+            indexed = {doc["path"]: doc for doc in self.meta["documents"]} if self.meta["model"] == model else {}
+            digests = {os.path.abspath(pdf_path): file_digest(pdf_path) for pdf_path in pdf_files}
+            changed = [pdf_path for pdf_path in pdf_files
+                       if indexed.get(os.path.abspath(pdf_path), {}).get("digest") != digests[os.path.abspath(pdf_path)]]
+            if not changed and self._kind_for(len(self)) == self.meta["kind"]:
+                return 0
+
+            added, vector_parts, sections = [], [], []
+            for pdf_path, parsed, _, error in iter_parsed_pdfs(changed, workers, store):
+                if error is not None:
+                    log(f"ERROR indexing {pdf_path}: {error}")
+                    continue
+                kept = filter_sections(parsed, min_text_length)
+                added.append({
+                    "path": os.path.abspath(pdf_path),
+                    "name": os.path.basename(pdf_path),
+                    "digest": digests[os.path.abspath(pdf_path)],
+                    "start": len(self) + len(sections),
+                    "count": len(kept)
+                })
+                titles = [sec.get("section_title", "") for sec in kept]
+                if titles:
+                    vector_parts.append(normalize_rows(encode_texts(titles, batch_size)))
+                sections.extend(kept)
+
+            replaced = any(doc["path"] in indexed for doc in added)
+            rows = len(self) + len(sections)
+            if indexed and not replaced and len(self) and self._kind_for(rows) == self.meta["kind"]:
+                self._append(added, vector_parts, sections)
+            else:
+                self._rebuild(model, indexed, digests, added, vector_parts, sections)
+            self._load()
+        return len(added)
+
+    def _kind_for(self, rows):
+        if self.kind != "auto":
+            return self.kind
+        return "ivf" if rows >= IVF_MIN_ROWS else "flat"
+
+    def _rebuild(self, model, indexed, digests, added, vector_parts, sections):
+        """Writes a new generation holding the kept documents followed by ``added``."""
+        documents, kept_vectors, kept_sections = [], [], []
+        for doc in self.meta["documents"] if indexed else []:
+            if doc["path"] in digests and doc["digest"] != digests[doc["path"]]:
+                continue  # replaced by its new version in ``added``
+            start, count = doc["start"], doc["count"]
+            documents.append({**doc, "start": len(kept_sections)})
+            kept_vectors.append(np.asarray(self.vectors[start:start + count]))
+            kept_sections.extend(self.sections[i] for i in range(start, start + count))
+        for doc in added:
+            documents.append({**doc, "start": len(kept_sections) + doc["start"] - len(self)})
+        sections = kept_sections + sections
+        vectors = [v for v in kept_vectors + vector_parts if len(v)]
+        vectors = np.concatenate(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+        rows = len(sections)
+        kind = self._kind_for(rows) if rows else "flat"
+        generation = _generation()
+        files = {}
+        if rows:
+            files["vectors"] = f"vectors-{generation}.f32"
+            vectors.tofile(self._path(files["vectors"]))
+            files["doc_ids"] = f"doc_ids-{generation}.i32"
+            _doc_ids(documents, 0).tofile(self._path(files["doc_ids"]))
+            files["sections"] = [[0, f"sections-{generation}.sec"]]
+            write_sections(self._path(files["sections"][0][1]), sections)
+            if kind == "ivf":
+                files.update(self._train(vectors, generation))
+        stale = _file_names(self.meta["files"])
+        self._commit({"format": FORMAT_VERSION, "model": model, "kind": kind, "rows": rows,
+                      "dim": vectors.shape[1] if rows else 0, "trained_rows": rows if kind == "ivf" else 0,
+                      "documents": documents, "files": files}, stale)
+
+    def _append(self, added, vector_parts, sections):
+        """Appends ``added`` after the current rows, assigning IVF rows to the existing centroids."""
+        meta = {**self.meta, "files": dict(self.meta["files"])}
+        files = meta["files"]
+        rows = len(self)
+        stale = []
+        if sections:
+            vectors = np.concatenate(vector_parts)
+            first_id = len(meta["documents"])
+            _append_rows(self._path(files["vectors"]), rows * meta["dim"] * 4, vectors)
+            _append_rows(self._path(files["doc_ids"]), rows * 4, _doc_ids(added, first_id))
+            name = f"sections-{_generation()}.sec"
+            write_sections(self._path(name), sections)
+            files["sections"] = files["sections"] + [[rows, name]]
+            meta["rows"] = rows + len(sections)
+            if meta["kind"] == "ivf":
+                assignments = np.concatenate([np.asarray(self.assignments),
+                                              assign_ivf(vectors, np.asarray(self.centroids))])
+                nlist = len(self.centroids)
+                sizes = np.bincount(assignments, minlength=nlist)
+                if (meta["rows"] > IVF_RETRAIN_GROWTH * meta["trained_rows"]
+                        or sizes.max() > IVF_RETRAIN_IMBALANCE * meta["rows"] / nlist):
+                    # Lists have drifted from the data: retrain over every row
+                    generation = _generation()
+                    all_vectors = np.memmap(self._path(files["vectors"]), np.float32, "r",
+                                            shape=(meta["rows"], meta["dim"]))
+                    stale += [files[name] for name in IVF_FILES]
+                    files.update(self._train(all_vectors, generation))
+                    meta["trained_rows"] = meta["rows"]
+                else:
+                    _append_rows(self._path(files["assignments"]), rows * 4, assignments[rows:])
+                    stale += [files["list_rows"], files["list_offsets"]]
+                    files.update(self._save_lists(assignments, nlist, _generation()))
+        meta["documents"] = meta["documents"] + added
+        self._commit(meta, stale)
+
+    def _train(self, vectors, generation):
+        """Trains IVF lists over ``vectors``; returns the names of the files written."""
+        rows = len(vectors)
+        nlist = max(1, min(rows, int(np.sqrt(rows))))
+        centroids, assignments = train_ivf(vectors, nlist)
+        files = {"centroids": f"centroids-{generation}.npy", "assignments": f"assignments-{generation}.i32"}
+        np.save(self._path(files["centroids"]), centroids)
+        assignments.tofile(self._path(files["assignments"]))
+        files.update(self._save_lists(assignments, nlist, generation))
+        return files
+
+    def _save_lists(self, assignments, nlist, generation):
+        list_rows = np.argsort(assignments, kind="stable").astype(np.int32)
+        list_offsets = np.zeros(nlist + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignments, minlength=nlist), out=list_offsets[1:])
+        files = {"list_rows": f"list_rows-{generation}.npy", "list_offsets": f"list_offsets-{generation}.npy"}
+        np.save(self._path(files["list_rows"]), list_rows)
+        np.save(self._path(files["list_offsets"]), list_offsets)
+        return files
+
+    def _commit(self, meta, stale):
+        """Atomically replaces ``index.json`` with ``meta``, then deletes files it no longer uses."""
+        self.meta = meta
+        fd, tmp_path = tempfile.mkstemp(dir=self.dir, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, self.index_path)
+        # Safe once the new index is visible; open mappings keep the old files alive
+        in_use = set(_file_names(meta["files"]))
+        for name in set(stale + getattr(self, "_stale", [])) - in_use:
+            try:
+                os.remove(self._path(name))
+            except OSError:
+                pass
+        self._stale = []
+
+    def search(self, query_emb, k, pdf_files=None):
+        """
+        Rows of the ``k`` sections whose titles are most similar to
+        ``query_emb``, with their cosine similarities. ``pdf_files``
+        restricts the search to those documents and orders rows (and breaks
+        ties) by their position in it, as if the documents had been parsed in
+        that order; otherwise rows are in index order. Restricted searches
+        over fewer than ``IVF_MIN_ROWS`` sections are always exact.
+        """
+        if not len(self):
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        query = normalize_rows(np.asarray(query_emb)[None, :])[0]
+        allowed = None
+        if pdf_files is not None:
+            order = {}
+            for pdf_path in pdf_files:
+                order.setdefault(os.path.abspath(pdf_path), len(order))
+            # Input position of every indexed document; those not requested sort last
+            position = np.array([order.get(doc["path"], len(order)) for doc in self.meta["documents"]],
+                                dtype=np.int64)
+            allowed = position[self.doc_ids] < len(order)
+        if self.meta["kind"] == "ivf" and (allowed is None or allowed.sum() >= IVF_MIN_ROWS):
+            # Probe the inverted lists whose centroids are closest to the query
+            probe = top_k_indices(self.centroids @ query, self.nprobe)
+            candidates = np.sort(np.concatenate([
+                self.list_rows[self.list_offsets[c]:self.list_offsets[c + 1]] for c in probe
+            ]))
+        else:
+            candidates = np.arange(len(self))
+        if allowed is not None:
+            candidates = candidates[allowed[candidates]]
+            candidates = candidates[np.lexsort((candidates, position[self.doc_ids[candidates]]))]
+        scores = self.vectors[candidates] @ query
+        top = np.sort(top_k_indices(scores, k))
+        return candidates[top], scores[top].astype(np.float64)
+
+    def rank(self, persona, job, top_n=12, shortlist=DEFAULT_SHORTLIST, pdf_files=None):
+        """
+        Pulls the ``shortlist`` most similar sections from the index, then
+        applies the full ``score_sections`` scoring (keyword, constraint and
+        quality on top of the stored similarities) to that shortlist only.
+        """
+        # Rows come in input order, so score ties resolve as in the non-indexed pipeline
+        rows, similarity = self.search(get_embedding(query_text(persona, job)), max(shortlist, top_n), pdf_files)
+        documents = self.meta["documents"]
+        candidates = []
+        for row in rows:
+            sec = self.sections[row]
+            sec["document"] = documents[self.doc_ids[row]]["name"]
+            candidates.append(sec)
+        return score_sections(candidates, persona, job, top_n, semantic_scores=similarity)["sections"]